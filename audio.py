@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pyglet
+from pyglet.media.codecs import AudioFormat
+
+SAMPLE_RATE = 44100
+
+# Fixed pyfxr explosion parameters, so every launch sounds the same and the cache stays valid
+SOUND_PARAMS = {
+    'spawn': {'wave_type': 3, 'base_freq': 0.085, 'freq_ramp': -0.284, 'env_attack': 0.0, 'env_sustain': 0.327,
+              'env_decay': 0.379, 'env_punch': 0.298},
+    'rotate': {'wave_type': 3, 'base_freq': 0.166, 'freq_ramp': -0.254, 'env_attack': 0.0, 'env_sustain': 0.263,
+               'env_decay': 0.165, 'pha_offset': 0.358, 'pha_ramp': 0.0, 'env_punch': 0.283},
+    'land': {'wave_type': 3, 'base_freq': 0.379, 'freq_ramp': -0.269, 'env_attack': 0.0, 'env_sustain': 0.36,
+             'env_decay': 0.49, 'env_punch': 0.451, 'arp_speed': 0.818, 'arp_mod': -0.578},
+    'game_over': {'wave_type': 3, 'base_freq': 0.156, 'freq_ramp': -0.331, 'env_attack': 0.0, 'env_sustain': 0.228,
+                  'env_decay': 0.158, 'pha_offset': 0.515, 'pha_ramp': -0.178, 'env_punch': 0.282},
+    # Undo / back to checkpoint
+    'restore': {'wave_type': 3, 'base_freq': 0.122, 'freq_ramp': 0.262, 'env_attack': 0.0, 'env_sustain': 0.21,
+                'env_decay': 0.3, 'env_punch': 0.2},
+    # Hit sound for block-block collisions
+    'hit': {'wave_type': 3, 'base_freq': 0.239, 'freq_ramp': 0.004, 'env_attack': 0.0, 'env_sustain': 0.332,
+            'env_decay': 0.285, 'env_punch': 0.368, 'vib_strength': 0.232, 'vib_speed': 0.392},
+}
+
+
+class PCMSource(pyglet.media.StaticSource):
+    """StaticSource over raw 16-bit mono PCM that is already in memory.
+
+    Keep the data a bytes object: pyglet wraps it in a BytesIO for every play, which
+    shares a bytes buffer but copies anything else (like an mmap).
+    """
+
+    def __init__(self, data, sample_rate=SAMPLE_RATE):
+        self.audio_format = AudioFormat(channels=1, sample_size=16, sample_rate=sample_rate)
+        self._data = data
+        self._duration = len(data) / self.audio_format.bytes_per_second
+
+
+class SoundBank:
+    """Pre-rendered sound effects played through a fixed pool of voices.
+
+    Each sound is synthesized with pyfxr once and its PCM stored in cache_dir under a
+    hash of its generator parameters; later launches read that file instead.
+    Loading runs on a background thread started by start(); sounds requested before
+    they are ready are skipped. At most `voices` players exist, and when all are busy
+    the one that started first is stolen.
+    """
+
+    VOICES = 8
+
+    def __init__(self, cache_dir, params=None, voices=VOICES):
+        self.cache_dir = cache_dir
+        self.params = params if params is not None else SOUND_PARAMS
+        self.voices = voices
+        # name -> PCM buffer, filled by the loader thread
+        self._pcm = {}
+        # name -> PCMSource, created on the main thread on first play
+        self._sources = {}
+        # [player, started_at, busy_until]
+        self._voices = []
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._load_all, name="soundbank", daemon=True)
+        self._thread.start()
+
+    def play(self, name, volume=1.0):
+        source = self._sources.get(name)
+        if source is None:
+            pcm = self._pcm.get(name)
+            if pcm is None:
+                return  # Still loading
+            source = self._sources[name] = PCMSource(pcm)
+        now = time.perf_counter()
+        voice = self._voice(now)
+        player = voice[0]
+        had_source = player.source is not None
+        player.queue(source)
+        if had_source:
+            # Cut off whatever this voice was playing
+            player.next_source()
+        player.volume = volume
+        player.play()
+        voice[1] = now
+        voice[2] = now + source.duration
+
+    def _voice(self, now):
+        for voice in self._voices:
+            if voice[2] <= now:
+                return voice
+        if len(self._voices) < self.voices:
+            voice = [pyglet.media.Player(), 0.0, 0.0]
+            self._voices.append(voice)
+            return voice
+        # Every voice is busy: steal the oldest one
+        return min(self._voices, key=lambda v: v[1])
+
+    def _load_all(self):
+        start = time.perf_counter()
+        synthesized = 0
+        for name, params in self.params.items():
+            try:
+                pcm, fresh = self._load(params)
+                synthesized += fresh
+                self._pcm[name] = pcm
+            except Exception as e:
+                print(f"[audio] failed to load {name}: {e}")
+        print(f"[audio] {len(self._pcm)} sounds ready ({synthesized} synthesized) in "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def _load(self, params):
+        key = hashlib.sha1(json.dumps([SAMPLE_RATE, params], sort_keys=True).encode("utf-8")).hexdigest()
+        path = os.path.join(self.cache_dir, f"{key}.pcm")
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                return f.read(), False
+        import pyfxr  # Only needed on a cache miss
+
+        pcm = bytes(memoryview(pyfxr.SFX(**params).build()))
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write then rename so a crash never leaves a truncated cache file behind
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(pcm)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[audio] could not cache sound: {e}")
+        return pcm, True
@@ -0,0 +1,324 @@
+"""Headless batch runs for difficulty and balance tuning.
+
+Plays many complete games (until game over, or --max-seconds of game time) with a
+scripted player, over every combination of the given parameter values, and writes
+per-setting aggregates: survival time, blocks placed, score distribution and step cost.
+
+    python batch.py --games 200 --grid spawn_delay=1.5,2.0,2.5 --grid gravity=-200,-300
+    python batch.py --policy center,lowest --grid friction=0.5,0.8 --csv games.csv
+
+Games are independent (each one builds its own SkyboxSim, and with it its own
+pymunk.Space), so they are spread over a process pool and throughput grows with the
+number of cores. Every setting is played with the same seeds, so settings are compared
+on the same block sequences, and results don't depend on which worker ran what.
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+from profiler import perf_counter
+from sim import SkyboxSim, CMD_LEFT, CMD_RIGHT, CMD_DROP, CMD_ROTATE
+
+SEED = 1234
+MAX_SECONDS = 600.0
+# Tunable name -> SkyboxSim attribute it overrides
+PARAMS = {
+    "spawn_delay": "SPAWN_DELAY",
+    "ramp": "SPAWN_DELAY_STEP",
+    "ramp_blocks": "SPAWN_RAMP_BLOCKS",
+    "min_spawn_delay": "MIN_SPAWN_DELAY",
+    "block_scale": "BLOCK_SCALE",
+    "friction": "BLOCK_FRICTION",
+    "gravity": "GRAVITY",
+}
+
+
+class Policy:
+    """A scripted player. act(sim) runs before every tick and presses/releases commands like a person would."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.current = None
+
+    def act(self, sim):
+        falling = sim.falling_block[0] if sim.falling_block else None
+        if falling is None:
+            return
+        if falling is not self.current:
+            self.current = falling
+            for command in list(sim.held):
+                sim.release(command)
+            self.new_block(sim, falling)
+        self.steer(sim, falling)
+
+    def new_block(self, sim, body):
+        pass
+
+    def steer(self, sim, body):
+        pass
+
+
+class RandomPolicy(Policy):
+    """Rotates at random, slides a random way for a moment, then fast drops."""
+
+    def new_block(self, sim, body):
+        for _ in range(self.rng.randint(0, 3)):
+            sim.press(CMD_ROTATE)
+            sim.release(CMD_ROTATE)
+        sim.press(self.rng.choice((CMD_LEFT, CMD_RIGHT)))
+        self.drop_at = sim.steps + self.rng.randint(0, 40)
+
+    def steer(self, sim, body):
+        if sim.steps == self.drop_at:
+            sim.press(CMD_DROP)
+
+
+class TargetPolicy(Policy):
+    """Steers each block over a target x, then fast drops it.
+
+    It drops wherever the block is once it stops getting closer to the target (say it's
+    pushed against the side of the tower, where friction can hold it up indefinitely)
+    or has been steered for MAX_STEER_TICKS.
+    """
+
+    TOLERANCE = 6.0  # px
+    SLOW_DOWN = 40.0  # px from the target where it stops pushing
+    STALL_TICKS = 30  # ticks without getting closer to the target before giving up on it
+    MAX_STEER_TICKS = 600
+
+    def __init__(self, seed):
+        super().__init__(seed)
+        # Block being steered: (body, tick steering started, closest distance, tick it was reached)
+        self._progress = None
+
+    def new_block(self, sim, body):
+        self.target = self.pick_target(sim, body)
+
+    def pick_target(self, sim, body):
+        return sim.width / 2
+
+    def steer(self, sim, body):
+        if CMD_DROP in sim.held:
+            return
+        offset = self.target - body.position.x
+        progress = self._progress
+        if progress is None or progress[0] is not body:
+            progress = self._progress = (body, sim.steps, abs(offset), sim.steps)
+        elif abs(offset) < progress[2] - 1.0:
+            progress = self._progress = (body, progress[1], abs(offset), sim.steps)
+        stalled = sim.steps - progress[3] > self.STALL_TICKS or sim.steps - progress[1] > self.MAX_STEER_TICKS
+        if abs(offset) < self.TOLERANCE or stalled:
+            for command in (CMD_LEFT, CMD_RIGHT):
+                if command in sim.held:
+                    sim.release(command)
+            sim.press(CMD_DROP)
+            return
+        push = CMD_RIGHT if offset > 0 else CMD_LEFT
+        other = CMD_LEFT if push == CMD_RIGHT else CMD_RIGHT
+        if other in sim.held:
+            sim.release(other)
+        if abs(offset) > self.SLOW_DOWN or body.velocity.x * offset <= 0:
+            if push not in sim.held:
+                sim.press(push)
+        elif push in sim.held:
+            sim.release(push)
+
+
+class CenterPolicy(TargetPolicy):
+    """Drops everything in the middle (what the centered bonus rewards)."""
+
+
+class LowestPolicy(TargetPolicy):
+    """Drops each block over the lowest part of the tower."""
+
+    COLUMNS = 12
+
+    def pick_target(self, sim, body):
+        heights = sim.skyline(self.COLUMNS).tolist()
+        low = min(heights)
+        # Ties go to the column nearest the middle, so an empty floor builds up from the center
+        column = min((i for i, height in enumerate(heights) if height <= low + 1.0),
+                     key=lambda i: abs(i - (self.COLUMNS - 1) / 2))
+        left, right = sim.WALL_THICKNESS, sim.width - sim.WALL_THICKNESS
+        return left + (column + 0.5) * (right - left) / self.COLUMNS
+
+
+POLICIES = {"random": RandomPolicy, "center": CenterPolicy, "lowest": LowestPolicy}
+
+# Per worker: params -> (sim class, prefabs), so the catalog is decomposed once per setting
+_classes = {}
+
+
+def sim_class(params):
+    key = tuple(sorted(params.items()))
+    if key not in _classes:
+        cls = type("TunedSim", (SkyboxSim,), {PARAMS[name]: value for name, value in params.items()})
+        _classes[key] = (cls, cls.build_prefabs())
+    return _classes[key]
+
+
+def play(task):
+    """Play one game to the end (or max_ticks). Runs in a worker process."""
+    params, policy_name, seed, max_ticks = task
+    cls, prefabs = sim_class(params)
+    sim = cls(prefabs=prefabs, seed=seed)
+    # Its own generator, so the policy's choices don't change the block sequence
+    policy = POLICIES[policy_name](seed ^ 0x5EED)
+    start = perf_counter()
+    while not sim.game_over and sim.steps < max_ticks:
+        policy.act(sim)
+        sim.step()
+    elapsed = perf_counter() - start
+    return {
+        "params": params,
+        "policy": policy_name,
+        "seed": seed,
+        "survived_s": sim.steps * sim.FIXED_DT,
+        "game_over": sim.game_over,
+        "blocks_placed": sim.blocks_placed,
+        "score": sim.score,
+        "best_height": sim.best_height,
+        "ticks": sim.steps,
+        "step_ms": elapsed / sim.steps * 1000.0 if sim.steps else 0.0,
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[int((len(values) - 1) * fraction)] if values else 0.0
+
+
+def summarize(games):
+    """Aggregate the games of one setting."""
+    survived = [game["survived_s"] for game in games]
+    scores = [game["score"] for game in games]
+    ticks = sum(game["ticks"] for game in games)
+    return {
+        "games": len(games),
+        "game_over_rate": sum(game["game_over"] for game in games) / len(games),
+        "survived_s_mean": statistics.fmean(survived),
+        "survived_s_median": statistics.median(survived),
+        "survived_s_p10": percentile(survived, 0.1),
+        "survived_s_p90": percentile(survived, 0.9),
+        "blocks_placed_mean": statistics.fmean(game["blocks_placed"] for game in games),
+        "best_height_mean": statistics.fmean(game["best_height"] for game in games),
+        "score_mean": statistics.fmean(scores),
+        "score_stdev": statistics.pstdev(scores),
+        "score_p10": percentile(scores, 0.1),
+        "score_p50": percentile(scores, 0.5),
+        "score_p90": percentile(scores, 0.9),
+        "score_max": max(scores),
+        # Weighted by ticks: the cost of a simulated tick across the whole setting
+        "step_ms_mean": sum(game["step_ms"] * game["ticks"] for game in games) / ticks if ticks else 0.0,
+    }
+
+
+def parse_grid(specs):
+    """['gravity=-200,-300', ...] -> list of param dicts, one per combination."""
+    names, values = [], []
+    for spec in specs:
+        name, _, raw = spec.partition("=")
+        name = name.strip()
+        if name not in PARAMS or not raw:
+            raise ValueError(f"bad --grid {spec!r}; expected NAME=V1,V2,... with NAME one of {', '.join(PARAMS)}")
+        cast = int if name == "ramp_blocks" else float
+        names.append(name)
+        values.append([cast(value) for value in raw.split(",")])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def label(params, policy):
+    settings = " ".join(f"{name}={value:g}" for name, value in params.items())
+    return f"{policy} {settings}".strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many headless SkyBox games over a parameter grid")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2",
+                        help=f"values to try for one parameter ({', '.join(PARAMS)}); repeat for a grid")
+    parser.add_argument("--policy", default="random", help=f"comma separated players: {', '.join(POLICIES)}")
+    parser.add_argument("--games", type=int, default=100, help="games per setting and policy")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed of the first game")
+    parser.add_argument("--max-seconds", type=float, default=MAX_SECONDS, help="game time after which a game is cut off")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument("--output", default="batch.json", help="where to write the aggregated results (JSON)")
+    parser.add_argument("--csv", metavar="PATH", help="also write one row per game to PATH")
+    args = parser.parse_args(argv)
+
+    try:
+        grid = parse_grid(args.grid)
+    except ValueError as e:
+        parser.error(str(e))
+    policies = [name.strip() for name in args.policy.split(",")]
+    for name in policies:
+        if name not in POLICIES:
+            parser.error(f"unknown policy {name!r}; expected one of {', '.join(POLICIES)}")
+    max_ticks = int(args.max_seconds / SkyboxSim.FIXED_DT)
+    tasks = [(params, policy, args.seed + i, max_ticks)
+             for params in grid for policy in policies for i in range(args.games)]
+    jobs = max(1, min(args.jobs, len(tasks)))
+    print(f"[batch] {len(tasks)} games ({len(grid)} settings x {len(policies)} policies x {args.games}) on {jobs} workers")
+
+    start = time.perf_counter()
+    games = []
+    # Small chunks keep all workers busy to the end even though game lengths vary a lot
+    chunksize = max(1, len(tasks) // (jobs * 8))
+    with multiprocessing.Pool(jobs) as pool:
+        for game in pool.imap_unordered(play, tasks, chunksize):
+            games.append(game)
+            if len(games) % max(1, len(tasks) // 10) == 0:
+                print(f"[batch] {len(games)}/{len(tasks)} games ({time.perf_counter() - start:.1f}s)")
+    elapsed = time.perf_counter() - start
+    # Completion order depends on scheduling; sort so the output doesn't
+    games.sort(key=lambda game: (grid.index(game["params"]), policies.index(game["policy"]), game["seed"]))
+
+    ticks = sum(game["ticks"] for game in games)
+    results = {
+        "meta": {
+            "games": len(games),
+            "jobs": jobs,
+            "seed": args.seed,
+            "max_seconds": args.max_seconds,
+            "elapsed_s": elapsed,
+            "ticks_per_s": ticks / elapsed if elapsed else 0.0,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "settings": [],
+    }
+    for params in grid:
+        for policy in policies:
+            summary = summarize([game for game in games if game["params"] == params and game["policy"] == policy])
+            results["settings"].append({"params": params, "policy": policy, **summary})
+            print(f"[batch] {label(params, policy):<40} survived {summary['survived_s_mean']:7.1f}s  "
+                  f"blocks {summary['blocks_placed_mean']:6.1f}  score p10/p50/p90 {summary['score_p10']:.0f}/"
+                  f"{summary['score_p50']:.0f}/{summary['score_p90']:.0f}  step {summary['step_ms_mean']:.3f} ms")
+    print(f"[batch] {len(games)} games, {ticks} ticks in {elapsed:.1f}s: "
+          f"{ticks / elapsed if elapsed else 0.0:.0f} ticks/s on {jobs} workers")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[batch] wrote {args.output}")
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            names = list(grid[0])
+            writer.writerow(names + ["policy", "seed", "survived_s", "game_over", "blocks_placed", "score",
+                                     "best_height", "ticks", "step_ms"])
+            for game in games:
+                writer.writerow([game["params"][name] for name in names] +
+                                [game["policy"], game["seed"], f"{game['survived_s']:.3f}", int(game["game_over"]),
+                                 game["blocks_placed"], game["score"], f"{game['best_height']:.1f}",
+                                 game["ticks"], f"{game['step_ms']:.4f}"])
+        print(f"[batch] wrote {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,409 @@
+"""Reproducible SkyBox performance benchmarks.
+
+Scenarios are built from the game's own block shapes with fixed seeds:
+
+* tower_N        - a brick tower of N blocks built row by row, then blocks dropped on top
+* collapse       - a tall column of blocks, left to settle, then tipped over
+* rapid_spawn    - the real game loop at the 0.5 s spawn_delay floor with a random player
+* replay:PATH    - a session recorded by main.py (see replay.py); measures its last --ticks ticks
+
+Each scenario reports tick/physics/callback timings from the simulation profiler,
+world snapshot/restore timings, draw_pymunk timings from a hidden window (when a GL context can be created) and the
+peak traced memory while it was built (so build_s includes tracemalloc's overhead). Results are written as JSON and can be compared to a baseline:
+
+    python bench.py --output bench.json
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --baseline bench_baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import pymunk
+
+from profiler import FrameProfiler, perf_counter
+from replay import InputLog, InputPlayer, game_prefabs
+from sim import SkyboxSim, CMD_LEFT, CMD_RIGHT, CMD_DROP
+
+SEED = 1234
+DEFAULT_SCENARIOS = ("tower_100", "tower_500", "tower_2000", "collapse", "rapid_spawn")
+MEASURE_TICKS = 600
+DRAW_FRAMES = 60
+VIEW_WIDTH, VIEW_HEIGHT = 800, 600  # the game's default window
+VIEW_PAN = 5  # px per frame the culled view moves
+SNAPSHOT_ROUNDS = 5
+
+
+def new_sim(seed, width=SkyboxSim.WIDTH):
+    profiler = FrameProfiler(SkyboxSim.PROFILE_PHASES, history=MEASURE_TICKS)
+    sim = SkyboxSim(width=width, endless=True, profiler=profiler, seed=seed)
+    return sim
+
+
+def idle(sim, ticks):
+    for _ in range(ticks):
+        sim.step()
+
+
+def settle(sim, max_ticks):
+    """Step until every block has been baked, or max_ticks."""
+    for _ in range(max_ticks):
+        if not sim.settler.awake:
+            break
+        sim.step()
+
+
+def take_over_spawning(sim):
+    """Stop the game's own spawning and drop the block setup() already spawned."""
+    if sim.falling_block:
+        sim.registry.remove(sim.falling_block[0])
+    sim.falling_block = None
+    sim.spawn_delay = math.inf
+
+
+class Scenario:
+    width = SkyboxSim.WIDTH
+
+    def new_sim(self, seed):
+        return new_sim(seed, self.width)
+
+
+class Tower(Scenario):
+    """Brick tower of rectangles between the walls, built a row at a time so lower rows
+    get to settle, and left to settle once more at the end so the measurement doesn't
+    pay for its last rows baking. The walls grow with the tower, so more blocks means
+    more rows: in the default world tower_2000 is about 200 rows of 10.
+    """
+
+    MAX_SETTLE_TICKS = 30 * 60
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.drop_y = 0.0
+
+    def build(self, sim):
+        take_over_spawning(sim)
+        left, bottom, right, top = sim.prefabs[0].bb
+        block_w, block_h = right - left, top - bottom
+        wall = sim.WALL_THICKNESS
+        inner_left, inner_right = wall + 1, sim.width - wall - 1
+        placed, row = 0, 0
+        while placed < self.blocks:
+            offset = block_w / 2 if row % 2 else 0.0
+            x = inner_left + offset + block_w / 2
+            y = wall + block_h / 2 + row * (block_h + 0.5)
+            while x + block_w / 2 <= inner_right and placed < self.blocks:
+                sim.create_block((x, y), 0)
+                placed += 1
+                x += block_w + 1
+            row += 1
+            idle(sim, 70)
+        settle(sim, self.MAX_SETTLE_TICKS)
+        self.drop_y = wall + row * (block_h + 0.5) + 150
+
+    def tick(self, sim, i):
+        # Keep dropping blocks onto the top so the measurement includes impacts and contacts
+        if i % 30 == 0:
+            sim.create_block((sim.rng.uniform(100, sim.width - 100), self.drop_y))
+        sim.step()
+
+
+class Collapse(Scenario):
+    """A column of rectangles that has settled (and baked), then gets tipped over.
+
+    Building stacks the column a few blocks at a time, each batch left to bake before
+    the next goes on top (a tall stack of moving blocks drifts over on its own), then
+    thaws it and sets it rotating about its foot, so the measured ticks are the column
+    falling and breaking up, not blocks in free fall.
+    """
+
+    HEIGHT = 120
+    STACK_BATCH = 5  # blocks added between idles while stacking
+    MAX_SETTLE_TICKS = 10 * 60  # per batch
+    TIP_SPEED = 0.3  # rad/s, clockwise
+
+    def build(self, sim):
+        take_over_spawning(sim)
+        left, bottom, right, top = sim.prefabs[0].bb
+        block_h = top - bottom
+        foot_x, foot_y = sim.width / 2, float(sim.WALL_THICKNESS)
+        column = []
+        for i in range(self.HEIGHT):
+            body, _ = sim.create_block((foot_x, foot_y + block_h / 2 + i * (block_h + 0.5)), 0)
+            column.append(body)
+            if len(column) % self.STACK_BATCH == 0 or len(column) == self.HEIGHT:
+                settle(sim, self.MAX_SETTLE_TICKS)
+        for body in column:
+            sim.settler.thaw(body, cascade=False)
+        # Rigid rotation about the foot: every block moves as part of one leaning column
+        for body in column:
+            x, y = body.position
+            body.angular_velocity = -self.TIP_SPEED
+            body.velocity = (self.TIP_SPEED * (y - foot_y), -self.TIP_SPEED * (x - foot_x))
+
+    def tick(self, sim, i):
+        sim.step()
+
+
+class RapidSpawn(Scenario):
+    """The real game loop with spawn_delay pinned at its floor and a random player.
+
+    Building plays WARMUP_TICKS of that game first, so the measurement runs on a
+    tower of the size a fast player actually reaches.
+    """
+
+    WARMUP_TICKS = 5 * 60 * 60
+
+    def build(self, sim):
+        sim.spawn_delay = sim.MIN_SPAWN_DELAY
+        self.rng = random.Random(sim.rng.random())
+        self.current = None
+        self.drop_at = -1
+        for i in range(self.WARMUP_TICKS):
+            self.tick(sim, i)
+
+    def tick(self, sim, i):
+        if sim.falling_block and sim.falling_block[0] is not self.current:
+            # New block: slide it a random way for a moment, then fast drop
+            self.current = sim.falling_block[0]
+            sim.held.clear()
+            sim.press(self.rng.choice((CMD_LEFT, CMD_RIGHT)))
+            self.drop_at = sim.steps + self.rng.randint(0, 40)
+        if sim.steps == self.drop_at:
+            sim.held.clear()
+            sim.press(CMD_DROP)
+        sim.step()
+        # The game keeps lowering the delay; the scenario keeps it pinned at the floor
+        sim.spawn_delay = sim.MIN_SPAWN_DELAY
+
+
+class Replay(Scenario):
+    """A recorded session. Building fast-forwards through all but its last `ticks` ticks,
+    so the measurement covers the end of the session, where the tower is biggest."""
+
+    def __init__(self, path, ticks):
+        self.log = InputLog.read(path)
+        self.ticks = ticks
+        self.player = None
+
+    def new_sim(self, seed):
+        # The recording decides the seed and the world
+        profiler = FrameProfiler(SkyboxSim.PROFILE_PHASES, history=MEASURE_TICKS)
+        return self.log.new_sim(prefabs=game_prefabs(), profiler=profiler)
+
+    def build(self, sim):
+        self.player = InputPlayer(self.log)
+        while sim.steps < self.log.last_tick - self.ticks and not sim.game_over:
+            self.tick(sim, sim.steps)
+
+    def tick(self, sim, i):
+        self.player.apply(sim)
+        sim.step()
+
+
+def scenario(name, ticks=MEASURE_TICKS):
+    if name.startswith("tower_"):
+        return Tower(int(name.split("_", 1)[1]))
+    if name == "collapse":
+        return Collapse()
+    if name == "rapid_spawn":
+        return RapidSpawn()
+    if name.startswith("replay:"):
+        return Replay(name.split(":", 1)[1], ticks)
+    raise ValueError(f"unknown scenario {name}")
+
+
+def run_scenario(name, ticks, seed, renderer):
+    case = scenario(name, ticks)
+    # Traced while the world is built, which is where it gets its size; untraced afterwards
+    # so the tick timings aren't slowed down
+    tracemalloc.start()
+    sim = case.new_sim(seed)
+    build_start = perf_counter()
+    case.build(sim)
+    build_s = perf_counter() - build_start
+    peak_mem_kb = tracemalloc.get_traced_memory()[1] / 1024.0
+    tracemalloc.stop()
+    sim.profiler.enabled = True
+    tick_times = []
+    for i in range(ticks):
+        start = perf_counter()
+        case.tick(sim, i)
+        tick_times.append(perf_counter() - start)
+        sim.profiler.end_frame()
+    tick_times.sort()
+    result = {
+        "blocks": len(sim.registry),
+        "baked": len(sim.settler.baked),
+        "ticks": ticks,
+        "build_s": round(build_s, 3),
+        "tick_ms_mean": sum(tick_times) / len(tick_times) * 1000.0,
+        "tick_ms_p95": tick_times[int((len(tick_times) - 1) * 0.95)] * 1000.0,
+        "peak_mem_kb": peak_mem_kb,
+    }
+    for phase in ("physics", "callbacks"):
+        avg, p95, _ = sim.profiler.stats(phase)
+        result[f"{phase}_ms_mean"] = avg
+        result[f"{phase}_ms_p95"] = p95
+    if renderer:
+        result.update(measure_draw(renderer, sim))
+    # Last, since restoring changes the world
+    result.update(measure_snapshots(case, sim))
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in result.items()}
+
+
+def make_renderer():
+    """Hidden window + BlockRenderer for draw timings, or None when no GL context is available."""
+    try:
+        import arcade
+        from render import BlockRenderer
+
+        window = arcade.Window(SkyboxSim.WIDTH, SkyboxSim.HEIGHT, "SkyBox bench", visible=False)
+        return window, BlockRenderer()
+    except Exception as e:
+        print(f"[bench] draw timings disabled: {e}")
+        return None
+
+
+def measure_snapshots(case, sim, rounds=SNAPSHOT_ROUNDS):
+    """Time taking a snapshot every few ticks, then restoring the first one after those ticks."""
+    snapshot_times = []
+    first = None
+    for i in range(rounds):
+        start = perf_counter()
+        snapshot = sim.snapshot()
+        snapshot_times.append(perf_counter() - start)
+        if first is None:
+            first = snapshot
+        for _ in range(12):
+            case.tick(sim, sim.steps)
+    start = perf_counter()
+    sim.restore(first)
+    restore_time = perf_counter() - start
+    return {
+        "snapshot_ms_mean": sum(snapshot_times) / len(snapshot_times) * 1000.0,
+        "restore_ms_mean": restore_time * 1000.0,
+    }
+
+
+def measure_draw(renderer, sim):
+    window, blocks = renderer
+    blocks.clear()
+    for shape in sim.space.shapes:
+        if shape.body.body_type == pymunk.Body.STATIC and shape.body not in sim.registry:
+            blocks.add_static(shape)
+    for body in sim.registry.blocks:
+        blocks.add_block(body)
+    for body in sim.settler.baked:
+        blocks.freeze_block(body)
+    times = []
+    for _ in range(DRAW_FRAMES):
+        start = perf_counter()
+        window.clear()
+        blocks.update()
+        blocks.draw()
+        window.ctx.finish()  # Wait for the GPU so the draw is actually counted
+        times.append(perf_counter() - start)
+    # Same again through a window-sized view of the tower top that pans sideways, as the game's camera would
+    blocks.space = sim.space
+    culled = []
+    for frame in range(DRAW_FRAMES):
+        x, y = sim.width / 2 + frame * VIEW_PAN, sim.tower_top
+        start = perf_counter()
+        window.clear()
+        blocks.set_view(x - VIEW_WIDTH / 2, y - VIEW_HEIGHT / 2, x + VIEW_WIDTH / 2, y + VIEW_HEIGHT / 2)
+        blocks.update()
+        blocks.draw()
+        window.ctx.finish()
+        culled.append(perf_counter() - start)
+    times.sort()
+    culled.sort()
+    return {
+        "draw_ms_mean": sum(times) / len(times) * 1000.0,
+        "draw_ms_p95": times[int((len(times) - 1) * 0.95)] * 1000.0,
+        "draw_culled_ms_mean": sum(culled) / len(culled) * 1000.0,
+        "draw_culled_ms_p95": culled[int((len(culled) - 1) * 0.95)] * 1000.0,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return (scenario, metric, baseline, current) for every metric that got worse than allowed."""
+    regressions = []
+    for name, metrics in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for metric, value in metrics.items():
+            if not (metric.endswith("_ms_mean") or metric.endswith("_ms_p95") or metric.endswith("_kb")):
+                continue
+            reference = base.get(metric)
+            if reference is None:
+                continue
+            # Ignore sub-microsecond noise on phases that barely run
+            if value > reference * (1.0 + threshold) and value - reference > 0.001:
+                regressions.append((name, metric, reference, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SkyBox performance benchmarks")
+    parser.add_argument("scenarios", nargs="*", default=list(DEFAULT_SCENARIOS),
+                        help=f"scenarios to run (default: {' '.join(DEFAULT_SCENARIOS)})")
+    parser.add_argument("--ticks", type=int, default=MEASURE_TICKS, help="measured ticks per scenario")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default="bench.json", help="where to write the results (JSON)")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", metavar="PATH", help="also write the results to PATH as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before a metric fails (0.2 = 20%%)")
+    parser.add_argument("--no-draw", action="store_true", help="skip draw_pymunk timings")
+    args = parser.parse_args(argv)
+
+    if not args.no_draw and not os.environ.get("DISPLAY"):
+        # No display: ask arcade for an offscreen (EGL) context
+        os.environ.setdefault("ARCADE_HEADLESS", "1")
+    renderer = None if args.no_draw else make_renderer()
+    results = {
+        "meta": {
+            "seed": args.seed,
+            "ticks": args.ticks,
+            "python": platform.python_version(),
+            "pymunk": pymunk.version,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "scenarios": {},
+    }
+    for name in args.scenarios:
+        start = time.perf_counter()
+        results["scenarios"][name] = metrics = run_scenario(name, args.ticks, args.seed, renderer)
+        print(f"[bench] {name:<12} tick {metrics['tick_ms_mean']:.3f} ms  physics {metrics['physics_ms_mean']:.3f} ms  "
+              f"callbacks {metrics['callbacks_ms_mean']:.3f} ms  draw {metrics.get('draw_ms_mean', float('nan')):.3f} ms  "
+              f"culled {metrics.get('draw_culled_ms_mean', float('nan')):.3f} ms  "
+              f"peak {metrics['peak_mem_kb']:.0f} KB  ({time.perf_counter() - start:.1f}s)")
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[bench] wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, reference, value in regressions:
+            print(f"[bench] REGRESSION {name}.{metric}: {reference:.4f} -> {value:.4f}")
+        if regressions:
+            return 1
+        print(f"[bench] no regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
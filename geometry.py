@@ -0,0 +1,147 @@
+class VertexBuffer:
+    """World-space vertices of every block, computed with one vectorized transform.
+
+    The local vertices of all block shapes sit in one contiguous (V, 2) array, shape
+    after shape, with the slot of the owning body per vertex and per-slot angle/position
+    arrays. world() rotates and translates the whole array at once instead of looping
+    over shapes in Python, and the debug wireframe and height queries all read from it.
+
+    The layout is only rebuilt on the next query after blocks came or went. Baked blocks
+    don't move, so on each query only the bodies in `moving` (the settler's awake dict)
+    and those passed to touch() since the last one are read back from Pymunk.
+
+    Only the queries use numpy, so it is imported on the first one (the wireframe or a
+    skyline) and a normal game starts without it.
+    """
+
+    def __init__(self, moving=()):
+        self.moving = moving
+        # body -> prefab index, insertion ordered
+        self._blocks = {}
+        # prefab index -> local vertices of its shapes, as tuples and (once built) as arrays
+        self._pieces = {}
+        self._arrays = {}
+        self._touched = {}
+        self._dirty = True
+        self.slots = {}
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def add(self, body, shapes):
+        index = shapes[0].user_data['index']
+        if index not in self._pieces:
+            self._pieces[index] = [[tuple(v) for v in shape.get_vertices()] for shape in shapes]
+        self._blocks[body] = index
+        self._dirty = True
+
+    def remove(self, body):
+        if self._blocks.pop(body, None) is not None:
+            self._dirty = True
+
+    def touch(self, body):
+        """Re-read body's pose on the next query (for blocks moved while not in `moving`)."""
+        self._touched[body] = None
+
+    def _build(self):
+        import numpy as np
+
+        bodies = list(self._blocks)
+        self.slots = {body: slot for slot, body in enumerate(bodies)}
+        arrays = self._arrays
+        local, owner, counts = [], [], []
+        for slot, body in enumerate(bodies):
+            index = self._blocks[body]
+            if index not in arrays:
+                arrays[index] = [np.array(piece, dtype=float) for piece in self._pieces[index]]
+            for piece in arrays[index]:
+                local.append(piece)
+                owner.append(slot)
+                counts.append(len(piece))
+        counts = np.array(counts, dtype=np.intp)
+        self.local = np.concatenate(local) if local else np.empty((0, 2))
+        # Per shape: owning slot and first vertex; per vertex: owning slot and shape
+        self.shape_owner = np.array(owner, dtype=np.intp)
+        self.starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+        self.owner = np.repeat(self.shape_owner, counts)
+        self.vertex_shape = np.repeat(np.arange(len(counts), dtype=np.intp), counts)
+        # Each vertex paired with the next one of its shape, wrapping around: the polygon edges
+        following = np.arange(1, len(self.local) + 1, dtype=np.intp)
+        if len(counts):
+            following[self.starts + counts - 1] = self.starts
+        self.edges = np.stack((np.arange(len(self.local), dtype=np.intp), following), axis=1).ravel()
+        self.angles = np.array([body.angle for body in bodies], dtype=float)
+        self.positions = np.array([tuple(body.position) for body in bodies], dtype=float).reshape(-1, 2)
+        self._touched.clear()
+        self._dirty = False
+
+    def _sync(self):
+        if self._dirty:
+            self._build()
+            return
+        slots, angles, positions = self.slots, self.angles, self.positions
+        for bodies in (self.moving, self._touched):
+            for body in bodies:
+                slot = slots.get(body)
+                if slot is not None:
+                    angles[slot] = body.angle
+                    positions[slot] = tuple(body.position)
+        self._touched.clear()
+
+    def world(self):
+        """(V, 2) array of every block vertex in world coordinates."""
+        import numpy as np
+
+        self._sync()
+        cos, sin = np.cos(self.angles)[self.owner], np.sin(self.angles)[self.owner]
+        x, y = self.local[:, 0], self.local[:, 1]
+        world = np.empty_like(self.local)
+        world[:, 0] = x * cos - y * sin
+        world[:, 1] = x * sin + y * cos
+        world += self.positions[self.owner]
+        return world
+
+    def shape_bounds(self, world=None):
+        """Per-shape (left, bottom, right, top) arrays."""
+        import numpy as np
+
+        if world is None:
+            world = self.world()
+        if not len(world):
+            empty = np.empty(0)
+            return empty, empty, empty, empty
+        x, y = world[:, 0], world[:, 1]
+        return (np.minimum.reduceat(x, self.starts), np.minimum.reduceat(y, self.starts),
+                np.maximum.reduceat(x, self.starts), np.maximum.reduceat(y, self.starts))
+
+    def lines(self, view=None):
+        """Edge endpoints of every shape overlapping view (left, bottom, right, top), for arcade.draw_lines."""
+        import numpy as np
+
+        world = self.world()
+        edges = self.edges
+        if view is not None and len(world):
+            left, bottom, right, top = self.shape_bounds(world)
+            visible = (right >= view[0]) & (left <= view[2]) & (top >= view[1]) & (bottom <= view[3])
+            # Two line endpoints per vertex
+            edges = edges[np.repeat(visible[self.vertex_shape], 2)]
+        return world[edges]
+
+    def skyline(self, left, right, columns, floor=0.0, exclude=()):
+        """Top of the blocks in `columns` equal-width columns between left and right.
+
+        A column's height is the highest top of any shape overlapping it, or `floor`.
+        Bodies in exclude (like the falling block) are ignored.
+        """
+        import numpy as np
+
+        edges = np.linspace(left, right, columns + 1)
+        shape_left, _, shape_right, shape_top = self.shape_bounds()
+        keep = np.ones(len(shape_top), dtype=bool)
+        for body in exclude:
+            slot = self.slots.get(body)
+            if slot is not None:
+                keep &= self.shape_owner != slot
+        shape_left, shape_right, shape_top = shape_left[keep], shape_right[keep], shape_top[keep]
+        covered = (shape_right[:, None] >= edges[None, :-1]) & (shape_left[:, None] <= edges[None, 1:])
+        return np.where(covered, shape_top[:, None], floor).max(axis=0, initial=floor)
@@ -0,0 +1,57 @@
+import itertools
+
+import pymunk
+
+
+class BlockRegistry:
+    """Live-block registry and out-of-bounds reaper.
+
+    Every block created by the simulation is registered here, so counting or iterating
+    blocks never has to scan space.bodies. Blocks whose position leaves bounds are
+    removed from the space together with their shapes; removing a shape makes Pymunk
+    run the separate callbacks of its contacts, which clears any collision-pair entries.
+    """
+
+    def __init__(self, space: pymunk.Space, bounds: pymunk.BB):
+        self.space = space
+        self.bounds = bounds
+        # body -> its shapes, insertion ordered
+        self.blocks = {}
+        self.shape_count = 0
+        self.on_remove = None
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, body):
+        return body in self.blocks
+
+    def add(self, body: pymunk.Body, shapes):
+        self.blocks[body] = tuple(shapes)
+        self.shape_count += len(self.blocks[body])
+
+    def remove(self, body: pymunk.Body):
+        shapes = self.blocks.pop(body, None)
+        if shapes is None:
+            return
+        self.shape_count -= len(shapes)
+        self.space.remove(body, *shapes)
+        if self.on_remove:
+            self.on_remove(body)
+
+    def reap(self, candidates, stride=1, offset=0):
+        """Remove every candidate body outside bounds. Only moving bodies need checking.
+
+        With stride > 1 only every stride-th candidate from offset is checked, so callers
+        can spread the check over several ticks.
+        """
+        bounds = self.bounds
+        left, bottom, right, top = bounds.left, bounds.bottom, bounds.right, bounds.top
+        lost = []
+        for body in itertools.islice(candidates, offset, None, stride):
+            x, y = body.position
+            if not (left <= x <= right and bottom <= y <= top):
+                lost.append(body)
+        for body in lost:
+            self.remove(body)
+        return lost
@@ -1,36 +1,70 @@
+import time
+
+STARTED = time.perf_counter()  # Startup timings count from here, imports included
+
+import argparse
 import arcade
-import pymunk
-from pymunk.autogeometry import convex_decomposition
-import math
-import random
 from arcade import Text
+import json
 import os
-import pyglet
-import pyfxr
+import threading
+
+from audio import SoundBank
+from profiler import FrameProfiler
+from render import BlockRenderer
+from replay import InputRecorder
+from sim import SkyboxSim, CMD_LEFT, CMD_RIGHT, CMD_DROP, CMD_ROTATE, CMD_UNDO, CMD_CHECKPOINT
 
 
 class TowerTetris(arcade.Window):
     SCREEN_WIDTH = 800
     SCREEN_HEIGHT = 600
     SCREEN_TITLE = "SkyBox"
-    BLOCK_SCALE = 1.8
-    def __init__(self):
-        super().__init__(self.SCREEN_WIDTH, self.SCREEN_HEIGHT, self.SCREEN_TITLE, resizable=True)
-        arcade.set_background_color(arcade.color.AMAZON)
+    KEY_COMMANDS = {
+        arcade.key.LEFT: CMD_LEFT,
+        arcade.key.RIGHT: CMD_RIGHT,
+        arcade.key.SPACE: CMD_DROP,
+        arcade.key.UP: CMD_ROTATE,
+        arcade.key.Z: CMD_UNDO,
+        arcade.key.C: CMD_CHECKPOINT,
+    }
+    PROFILE_PHASES = SkyboxSim.PROFILE_PHASES + ('background', 'blocks', 'text')
+    HUD_REFRESH_FRAMES = 15  # re-layout the profiling HUD text this often
+    CAMERA_FOLLOW = 4.0  # fraction of the distance to its target the camera covers per second
+    CAMERA_HEADROOM = 60  # px kept visible above the spawn point
+    SKYLINE_COLUMNS = 40
+    HEIGHTS_KEPT = 5  # entries in the best-height leaderboard
+    def __init__(self, endless=False, trace_path=None, record_path=None, seed=None):
+        startup = [("imports", time.perf_counter() - STARTED)]
         base_dir = os.path.dirname(__file__)
         bg_path = os.path.join(base_dir, "assets", "images", "city_pixel_bg.png")
+        # Decode the background on a thread while the window and GL context are created
+        loaded = {}
+        bg_loader = threading.Thread(target=self._load_background, args=(bg_path, loaded), name="background",
+                                     daemon=True)
+        bg_loader.start()
+        lap = time.perf_counter()
+        super().__init__(self.SCREEN_WIDTH, self.SCREEN_HEIGHT, self.SCREEN_TITLE, resizable=True)
+        arcade.set_background_color(arcade.color.AMAZON)
+        startup.append(("window", time.perf_counter() - lap))
+        lap = time.perf_counter()
         self.bg_texture = None
-        self.bg_sprites = arcade.SpriteList()
-        self.COL_BLOCK = 1
-        self.COL_DEATH = 2
+        # Lazy: the shared texture atlas is only created once it knows the background's size
+        self.bg_sprites = arcade.SpriteList(lazy=True)
         self.bg_scale_mode = "cover"  # 'stretch' | 'cover' | 'contain'
         if not os.path.exists(bg_path):
             print(f"[background] File not found: {bg_path}")
         else:
+            bg_loader.join()
             try:
-                # Load texture so we can query original size for scaling
-                self.bg_texture = arcade.load_texture(bg_path)
-                bg_sprite = arcade.Sprite(bg_path)
+                if "error" in loaded:
+                    raise loaded["error"]
+                self.bg_texture = loaded["texture"]
+                # Make room for it up front; growing the atlas later copies everything in it again
+                side = 1 << (max(self.bg_texture.width, self.bg_texture.height) + 1).bit_length()
+                self.ctx.atlas_size = (max(side, self.ctx.atlas_size[0]), max(side, self.ctx.atlas_size[1]))
+                # Same texture, so the file isn't read and decoded a second time
+                bg_sprite = arcade.Sprite(self.bg_texture)
                 bg_sprite.center_x = self.SCREEN_WIDTH / 2
                 bg_sprite.center_y = self.SCREEN_HEIGHT / 2
                 tex_w = bg_sprite.texture.width if bg_sprite.texture else self.SCREEN_WIDTH
@@ -51,33 +85,60 @@ class TowerTetris(arcade.Window):
             except Exception as e:
                 print(f"[background] Failed to load {bg_path}: {e}")
                 self.bg_texture = None
-        self.space = None
-        self.block_shapes = [
-            # Rectangle
-            [(-20, -10), (20, -10), (20, 10), (-20, 10), (-20, -10)],
-            # L-shape
-            [(-20, -20), (20, -20), (20, 0), (0, 0), (0, 20), (-20, 20), (-20, -20)],
-            # Penthouse-like
-            [(-15, -15), (15, -15), (15, 15), (-15, 15), (-10, 10), (10, 10), (10, 20), (-10, 20), (-15, -15)],
-            # T-shape
-            [(-10, -10), (10, -10), (0, 10), (-10, 10), (10, 10), (-10, -10)],
-
-        ]
-        self.falling_block = None
-        self.keys_pressed = set()
-        self.score = 0
-        self.last_shape_index = None
-        self.combo_multiplier = 1
-        self.game_over = False
+        startup.append(("background", time.perf_counter() - lap))
+        lap = time.perf_counter()
+        self.sim = None
+        self.endless = endless
+        self.seed = seed
+        # Every key press/release goes to this input log, so the session can be replayed with replay.py
+        self.record_path = record_path
+        self.recorder = None
+        self.renderer = BlockRenderer()
+        # World camera; follows the top of the tower, the background and texts stay in screen space
+        self.camera = arcade.Camera2D()
+        # Decompose, weigh and color every block type once; extra types can come from a data file
+        self.prefabs = SkyboxSim.build_prefabs(cache_path=os.path.join(base_dir, ".cache", "prefabs.json"),
+                                               blocks_path=os.path.join(base_dir, "assets", "data", "blocks.json"))
+        startup.append(("prefabs", time.perf_counter() - lap))
         self.score_text = None
+        self.height_text = None
+        self.lean_text = None
         self.game_over_text = None
-        self.blocks_placed = 0
-        self.spawn_delay = 2.0
-        self.time_since_last_land = 0.0
+        self._height_shown = None
+        # Best tower heights of past sessions, highest first
+        self.heights_path = os.path.join(base_dir, ".cache", "heights.json")
+        self.best_heights = self._load_heights()
+        self._heights_saved = False
+        # Timing is off (and close to free) unless the HUD is shown or a trace is being written
+        self.profiler = FrameProfiler(self.PROFILE_PHASES)
+        if trace_path:
+            self.profiler.open_trace(trace_path)
+            print(f"[profiler] writing trace to {trace_path}")
+        self.show_hud = False
+        self.show_wireframe = False
+        # Placement lookahead (see solver.py): workers are only started once H or A is pressed
+        self.solver = None
+        self.autoplayer = None
+        self.show_hint = False
+        self.placement = None
+        self.hud_texts = []
         self._bg_debug_printed = False
-        self._init_audio()
-        self._active_collisions = set()
+        # Sounds load from the disk cache (or get synthesized) in the background
+        self.sounds = SoundBank(os.path.join(base_dir, ".cache", "sounds"))
+        self.sounds.start()
+        lap = time.perf_counter()
         self.setup()
+        startup.append(("first block", time.perf_counter() - lap))
+        # Reported once the first frame is on screen
+        self.startup = startup
+
+    @staticmethod
+    def _load_background(path, loaded):
+        if os.path.exists(path):
+            try:
+                loaded["texture"] = arcade.load_texture(path)
+            except Exception as e:
+                loaded["error"] = e
 
     def _update_background_scale(self, width: int, height: int):
         # Recenter and scale background sprite to fill the window using the selected mode
@@ -106,111 +167,117 @@ class TowerTetris(arcade.Window):
         # Move texts to correct positions
         if self.score_text:
             self.score_text.y = self.SCREEN_HEIGHT - 20
+            self.height_text.y = self.SCREEN_HEIGHT - 42
+        if self.lean_text:
+            self.lean_text.x = self.SCREEN_WIDTH / 2
+            self.lean_text.y = self.SCREEN_HEIGHT - 30
         if self.game_over_text:
             self.game_over_text.x = self.SCREEN_WIDTH / 2
             self.game_over_text.y = self.SCREEN_HEIGHT / 2
         # Update background
         self._update_background_scale(self.SCREEN_WIDTH, self.SCREEN_HEIGHT)
+        self.camera.match_window()
+        if self.sim:
+            self.camera.position = (self.sim.width / 2, max(self.camera.position[1], self.SCREEN_HEIGHT / 2))
         # Let Arcade handle the rest
         return super().on_resize(width, height)
 
     def setup(self):
-        self.space = pymunk.Space()
-        self.space.gravity = (0, -200)  # Slower gravity
-
-        # Ground
-        wall_thickness = 20
-        ground_body = pymunk.Body(body_type=pymunk.Body.STATIC)
-        ground_shape = pymunk.Segment(ground_body, (wall_thickness, 0), (self.SCREEN_WIDTH - wall_thickness, 0), wall_thickness)
-        ground_shape.friction = 1.0  # High friction for ground
-        ground_shape.user_data = {'color': arcade.color.WHITE}
-        self.space.add(ground_body, ground_shape)
-
-        # Side walls
-        left_wall = pymunk.Body(body_type=pymunk.Body.STATIC)
-        left_shape = pymunk.Segment(left_wall, (0, 0), (0, self.SCREEN_HEIGHT + 100), wall_thickness)
-        left_shape.user_data = {'color': arcade.color.WHITE}
-        self.space.add(left_wall, left_shape)
-
-        right_wall = pymunk.Body(body_type=pymunk.Body.STATIC)
-        right_shape = pymunk.Segment(right_wall, (self.SCREEN_WIDTH, 0), (self.SCREEN_WIDTH, self.SCREEN_HEIGHT + 100), wall_thickness)
-        right_shape.user_data = {'color': arcade.color.WHITE}
-        self.space.add(right_wall, right_shape)
-
-        # Death sensor below the screen to detect falling blocks
-        death_body = pymunk.Body(body_type=pymunk.Body.STATIC)
-        death_shape = pymunk.Segment(death_body, (-1000, -150), (self.SCREEN_WIDTH + 1000, -150), 1)
-        death_shape.sensor = True
-        death_shape.collision_type = self.COL_DEATH
-        death_shape.user_data = {'sensor': True}
-        self.space.add(death_body, death_shape)
-
-        # Collision handler: block hits death sensor -> game over
-        handler = self.space.add_collision_handler(self.COL_BLOCK, self.COL_DEATH)
-        handler.begin = self._on_block_hits_death
-
-        # Collision handler: blocks colliding with each other -> play hit sounds
-        hit_handler = self.space.add_collision_handler(self.COL_BLOCK, self.COL_BLOCK)
-        # Use post_solve so we can read the collision impulse and respond after physics
-        hit_handler.post_solve = self._on_blocks_collide
-        # Use separate to clear active collision flag so future collisions will play again
-        hit_handler.separate = self._on_blocks_separate
-
-        self.time_since_last_land = 0.0
-        self.spawn_block()  # Initial immediate spawn
-
-        self.score_text = Text(f"Score: {self.score}", 10, self.SCREEN_HEIGHT - 20, arcade.color.WHITE, 16)
-        self.game_over_text = Text("Game Over! Press ESC to close.", self.SCREEN_WIDTH/2, self.SCREEN_HEIGHT/2,
-                                   arcade.color.RED, 30, anchor_x="center")
-
-    def create_block(self, position):
-        shape_index = random.choice(range(len(self.block_shapes)))
-        base_verts = self.block_shapes[shape_index]
-        scale = self.BLOCK_SCALE
-        scaled_verts = [(float(x) * scale, float(y) * scale) for (x, y) in base_verts]
-        convex_shapes_verts = convex_decomposition(scaled_verts, 0)
-        body = pymunk.Body()
-        body.position = position
-        self.space.add(body)
-        r = min(100 + shape_index * 50, 255)
-        g = min(int(150 + shape_index ** 1.5), 255)
-        b = min(255 - shape_index * 30, 255)
-        for verts in convex_shapes_verts:
-            shape = pymunk.Poly(body, verts)
-            shape.density = self.BLOCK_SCALE ** 2
-            shape.user_data = {'index': shape_index, 'color': (r, g, b, 255)}
-            shape.friction = 0.8  # Add friction to help blocks stay in place
-            shape.collision_type = self.COL_BLOCK
-            self.space.add(shape)
-        return body, shape
-
-    def spawn_block(self):
-        if self.falling_block:
+        self.sim = SkyboxSim(self.SCREEN_WIDTH, self.SCREEN_HEIGHT, prefabs=self.prefabs, listener=self._on_sim_event,
+                              endless=self.endless, profiler=self.profiler, seed=self.seed)
+        self.stop_recording()
+        if self.record_path:
+            try:
+                self.recorder = self.sim.recorder = InputRecorder(self.record_path, self.sim)
+                print(f"[replay] recording input to {self.record_path} (seed {self.sim.seed})")
+            except OSError as e:
+                print(f"[replay] could not record to {self.record_path}: {e}")
+        self.score_text = Text(f"Score: {self.sim.score}", 10, self.SCREEN_HEIGHT - 20, arcade.color.WHITE, 16)
+        self.height_text = Text("", 10, self.SCREEN_HEIGHT - 42, arcade.color.WHITE, 12)
+        self._height_shown = None
+        self._heights_saved = False
+        # The warning and game over texts are laid out the first time they're shown
+        self.camera.position = (self.sim.width / 2, self.SCREEN_HEIGHT / 2)
+
+    def _load_heights(self):
+        try:
+            with open(self.heights_path, "r", encoding="utf-8") as f:
+                return sorted((float(h) for h in json.load(f)), reverse=True)[:self.HEIGHTS_KEPT]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[heights] Ignoring unreadable {self.heights_path}: {e}")
+            return []
+
+    def save_heights(self):
+        """Add this run's best height to the leaderboard (once per game over)."""
+        if self._heights_saved or not self.sim or self.sim.best_height <= 0:
             return
-        self.falling_block = self.create_block((self.SCREEN_WIDTH // 2, self.SCREEN_HEIGHT - 50))
-        self.falling_block[0].velocity = (0, 0)  # Start with zero velocity for control
-        self._play_sfx('spawn')
+        self._heights_saved = True
+        self.best_heights = sorted(self.best_heights + [round(self.sim.best_height, 1)], reverse=True)[:self.HEIGHTS_KEPT]
+        try:
+            os.makedirs(os.path.dirname(self.heights_path), exist_ok=True)
+            with open(self.heights_path, "w", encoding="utf-8") as f:
+                json.dump(self.best_heights, f)
+        except OSError as e:
+            print(f"[heights] Failed to write {self.heights_path}: {e}")
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.close(self.sim)
+            self.recorder = None
+
+    def _on_sim_event(self, event, value):
+        # Translate simulation events into rendering and audio
+        if event == 'setup':
+            # Ground and walls only change when the walls grow: upload them to the renderer once
+            self.renderer.clear()
+            self.renderer.space = value
+            self.renderer.set_static(value.shapes)
+        elif event == 'walls':
+            self.renderer.set_static(value)
+        elif event == 'block_added':
+            self.renderer.add_block(value)
+        elif event == 'block_removed':
+            self.renderer.remove_block(value)
+        elif event == 'block_baked':
+            self.renderer.freeze_block(value)
+        elif event == 'block_thawed':
+            self.renderer.thaw_block(value)
+        elif event == 'hit':
+            self._play_sfx('hit', value)
+        elif event == 'score':
+            if self.score_text:
+                self.score_text.text = f"Score: {value}"
+        elif event == 'lean':
+            pass  # The warning is drawn from sim.leaning
+        elif event == 'game_over':
+            self._play_sfx(event)
+            self.save_heights()
+        elif event == 'restore':
+            if not self.sim.game_over:
+                self._heights_saved = False  # Play resumed: the run's next game over is saved too
+            self._play_sfx(event)
+        else:
+            self._play_sfx(event)
 
     def draw_pymunk(self):
         """Draw all Pymunk shapes"""
-        for shape in self.space.shapes:
-            if isinstance(shape, pymunk.Segment):
-                # Skip invisible/sensor segments like the death line
-                if getattr(shape, "sensor", False) or (getattr(shape, "user_data", None) and shape.user_data.get("sensor")):
-                    continue
-                color = (shape.user_data.get('color') if getattr(shape, "user_data", None) else arcade.color.WHITE)
-                arcade.draw_line(shape.a.x, shape.a.y, shape.b.x, shape.b.y, color, 3)
-            elif isinstance(shape, pymunk.Poly):
-                # Get local vertices
-                local_verts = shape.get_vertices()
-                # Transform to world
-                world_verts = [(v.rotated(shape.body.angle) + shape.body.position) for v in local_verts]
-                color = (shape.user_data.get('color') if getattr(shape, "user_data", None) else arcade.color.WHITE)
-                arcade.draw_polygon_filled([(v.x, v.y) for v in world_verts], color)
+        # Only the blocks around what the camera sees get updated and drawn
+        x, y = self.camera.position
+        half_w, half_h = self.SCREEN_WIDTH / 2, self.SCREEN_HEIGHT / 2
+        view = (x - half_w, y - half_h, x + half_w, y + half_h)
+        self.renderer.set_view(*view)
+        self.renderer.update(self.sim.render_alpha, self.sim.previous_transforms)
+        self.renderer.draw()
+        if self.show_hint and self.placement and self.placement.pose and self.sim.falling_block:
+            prefab = self.sim.prefabs[self.sim.falling_block[1].user_data['index']]
+            self.renderer.draw_ghost(prefab, self.placement.pose)
+        if self.show_wireframe:
+            inner = self.sim.WALL_THICKNESS, self.sim.width - self.sim.WALL_THICKNESS
+            self.renderer.draw_wireframe(self.sim.geometry, view, inner + (self.sim.skyline(self.SKYLINE_COLUMNS),))
 
     def on_key_press(self, key, modifiers):
-        self.keys_pressed.add(key)
-
         # Global shortcuts
         if key == arcade.key.F:
             # Toggle fullscreen and update background scale to new size
@@ -227,145 +294,71 @@ class TowerTetris(arcade.Window):
             self.bg_scale_mode = modes[(idx + 1) % len(modes)]
             print(f"[background] scale mode: {self.bg_scale_mode}")
             self._update_background_scale(self.SCREEN_WIDTH, self.SCREEN_HEIGHT)
+        elif key == arcade.key.F3:
+            # Toggle the profiling HUD
+            self.show_hud = not self.show_hud
+            self.profiler.enabled = self.show_hud or self.profiler.tracing
+        elif key == arcade.key.F4:
+            # Toggle the physics wireframe and skyline overlay
+            self.show_wireframe = not self.show_wireframe
+        elif key == arcade.key.H:
+            # Toggle the ghost hint: where the solver would put the falling block
+            self.show_hint = not self.show_hint
+            self._start_solver()
+        elif key == arcade.key.A:
+            # Toggle the autoplayer
+            if self.autoplayer:
+                self.autoplayer = None
+            else:
+                from solver import AutoPlayer
 
-        # Gameplay controls
-        if self.falling_block:
-            if key == arcade.key.UP:
-                body = self.falling_block[0]
-                body.angle += math.pi / 2  # Rotate 90 degrees
-                self._play_sfx('rotate')
-    def on_key_hold(self, key):
-        if self.falling_block:
-            if key == arcade.key.RIGHT:
-                body = self.falling_block[0]
-                vx = min(200, body.velocity.x + 20) # adds velocity up to a certain point
-                body.velocity = (vx, body.velocity.y)
+                self.autoplayer = AutoPlayer(self._start_solver())
+            print(f"[solver] autoplayer {'on' if self.autoplayer else 'off'}")
 
-            elif key == arcade.key.LEFT:
-                body = self.falling_block[0]
-                vx = body.velocity.x
-                vx = max(-200, vx - 20) # adds velocity up to a certain point
-                body.velocity = (vx, body.velocity.y)
-            elif key == arcade.key.SPACE:
-                body = self.falling_block[0]
-                body.velocity = (0, max(-500, body.velocity.y - 100))  # Fast drop straight down
-                self.keys_pressed.discard(arcade.key.LEFT)
-                self.keys_pressed.discard(arcade.key.RIGHT)
+        # Gameplay controls
+        command = self.KEY_COMMANDS.get(key)
+        if command:
+            self.sim.press(command)
 
     def on_key_release(self, key, modifiers):
-        if key in self.keys_pressed:
-            self.keys_pressed.remove(key)
-
-    def on_update(self, delta_time):
-        if not self.game_over:
-            # Spawn new block after delay since last land, if no current falling block
-            if self.time_since_last_land >= self.spawn_delay and not self.falling_block:
-                self.spawn_block()
-                # Adjust delay every 10 blocks (after spawning, based on placed)
-                if self.blocks_placed % 10 == 0 and self.blocks_placed > 0:
-                    self.spawn_delay = max(0.5, self.spawn_delay - 0.2)
-            #else:
-            #    print(f"Time since last land: {self.time_since_last_land:.2f}s, Spawn delay: {self.spawn_delay:.2f}s")
-            temp_keys = self.keys_pressed.copy()
-            for key in temp_keys:
-                self.on_key_hold(key)
-            self.time_since_last_land += delta_time
-
-            # Apply input to falling block before physics
-            #if self.falling_block:
-            #    body = self.falling_block[0]
-            #    vx = 0
-            #    if arcade.key.LEFT in self.keys_pressed:
-            #        vx = -150
-            #    elif arcade.key.RIGHT in self.keys_pressed:
-            #        vx = 150
-            #    body.velocity = (vx, body.velocity.y)
-
-            # Step physics simulation
-            if self.space:
-                self.space.step(delta_time)
-
-            # Check for landing after physics step
-            if self.falling_block:
-                body = self.falling_block[0]
-                velocity_x = abs(body.velocity.x)
-                velocity_x = max(0, velocity_x - 5)  # Friction effect
-                body.velocity = (math.copysign(velocity_x, body.velocity.x), body.velocity.y)
-                self.falling_block = (body, self.falling_block[1])
-                if abs(body.velocity.y) < 3:  # Considered landed
-                    self.on_landing(body)
-
-            # Game over handled by death sensor collision
+        command = self.KEY_COMMANDS.get(key)
+        if command:
+            self.sim.release(command)
 
-    def _on_block_hits_death(self, arbiter, space, data):
-        # Trigger game over when any block hits the death sensor
-        try:
-            self._play_sfx('game_over')
-        except Exception:
-            pass
-        self.game_over = True
-        return True
+    def _start_solver(self):
+        if self.solver is None:
+            from solver import PlacementSolver  # Only loaded (with its process pool) once H or A is pressed
 
-    def _on_blocks_collide(self, arbiter, space, data):
-        # Called after two block shapes collide. Play the hit sound only once per contact.
-        try:
-            # Identify the two shapes involved and create a stable key for the pair
-            shapes = getattr(arbiter, "shapes", None)
-            if not shapes or len(shapes) < 2:
-                return True
-            key = tuple(sorted((id(shapes[0]), id(shapes[1]))))
-            # If we've already played a sound for this active contact, skip
-            if key in self._active_collisions:
-                return True
-            # Mark this contact as active so further post_solve calls for the same contact don't replay
-            self._active_collisions.add(key)
+            self.solver = PlacementSolver()
+        return self.solver
 
-            # Attempt to read collision impulse to set volume
-            impulse_vec = getattr(arbiter, "total_impulse", None)
-            if impulse_vec is None:
-                # No impulse available -> use a small default
-                impulse = 0.0
-            else:
-                # Try to get a length; fallback to converting to float
-                impulse = 0.0
-                try:
-                    impulse = float(getattr(impulse_vec, "length", impulse_vec))
-                except Exception:
-                    try:
-                        impulse = float(impulse_vec)
-                    except Exception:
-                        impulse = 0.0
+    def stop_solver(self):
+        if self.solver:
+            self.solver.close()
+            self.solver = None
 
-            # Map impulse to volume: choose a sensible scale factor and clamp
-            volume = max(0.05, min(1.0, impulse / 150.0))
-            snd = self.sfx.get('hit') if hasattr(self, "sfx") else None
-            if snd:
-                player = snd.play()
-                try:
-                    player.volume = volume
-                except Exception:
-                    # Some players may not support volume; ignore
-                    pass
-        except Exception as e:
-            print(f"[audio] collision play error: {e}")
-        # Return True to allow normal physics resolution to continue
-        return True
-
-    def _on_blocks_separate(self, arbiter, space, data):
-        # Called when two block shapes separate. Clear the active flag so future collisions between
-        # the same shapes will play sound again.
-        try:
-            shapes = getattr(arbiter, "shapes", None)
-            if not shapes or len(shapes) < 2:
-                return None
-            key = tuple(sorted((id(shapes[0]), id(shapes[1]))))
-            self._active_collisions.discard(key)
-        except Exception:
-            # Ignore errors here; separation cleanup is best-effort
-            pass
-        return None
+    def on_update(self, delta_time):
+        # The solver only gets polled here; evaluation runs in its worker processes
+        if self.autoplayer:
+            self.autoplayer.act(self.sim)
+            self.placement = self.autoplayer.placement
+        elif self.show_hint:
+            self.placement = self.solver.request(self.sim)
+        self.sim.on_update(delta_time)
+        self._follow_tower(delta_time)
+
+    def _follow_tower(self, delta_time):
+        # Keep the spawn point in view; never look below the ground
+        half_h = self.SCREEN_HEIGHT / 2
+        target = max(half_h, self.sim.spawn_height + self.CAMERA_HEADROOM - half_h)
+        x, y = self.camera.position
+        y += (target - y) * min(1.0, self.CAMERA_FOLLOW * delta_time)
+        self.camera.position = (self.sim.width / 2, y)
 
     def on_draw(self):
+        lap = time.perf_counter()
+        prof = self.profiler
+        prof.start()
         self.clear()  # Replace start_render
         if getattr(self, "bg_sprites", None) and len(self.bg_sprites) > 0:
             if not getattr(self, "_bg_debug_printed", True):
@@ -377,77 +370,92 @@ class TowerTetris(arcade.Window):
                 print("[background] no background sprites; drawing solid color")
                 self._bg_debug_printed = True
             arcade.draw_lrbt_rectangle_filled(0, self.SCREEN_WIDTH, 0, self.SCREEN_HEIGHT, arcade.color.BLACK)
-        if not self.game_over:
-            self.draw_pymunk()
+        prof.lap('background')
+        if not self.sim.game_over:
+            with self.camera.activate():
+                self.draw_pymunk()
         else:
+            if self.game_over_text is None:
+                self.game_over_text = Text("Game Over! Press ESC to close.", self.SCREEN_WIDTH / 2,
+                                           self.SCREEN_HEIGHT / 2, arcade.color.RED, 30, anchor_x="center")
             self.game_over_text.draw()
+        prof.lap('blocks')
         self.score_text.draw()
-
-    def on_landing(self, landed_body : pymunk.Body):
-        self._play_sfx('land')
-        shape_index = self.falling_block[1].user_data['index']
-        base_score = 10
-        if abs(landed_body.position.x - self.SCREEN_WIDTH / 2) < 30:
-            base_score += 20  # Centered bonus
-        if shape_index == self.last_shape_index and self.last_shape_index != None:
-            self.combo_multiplier += 0.5
-        else:
-            self.combo_multiplier = 1.0
-        self.score += int(base_score * self.combo_multiplier)
-        self.last_shape_index = shape_index
-        self.blocks_placed += 1
-        self.falling_block = None
-        self.time_since_last_land = 0.0  # Reset timer for next spawn delay
-        self.score_text.text = f"Score: {self.score}"
-
-
-    def fix_body(self, dynamic_body : pymunk.Body):
-        """Convert a dynamic body to static, preserving its shape and position.
-
-        this function is useless now since I found out we can just add friction on shapes
-        """
-
-        shape = list(dynamic_body.shapes)[0]
-        self.space.shapes.remove(shape)
-        self.space.remove(dynamic_body)
-
-        static_body = pymunk.Body(body_type=pymunk.Body.STATIC)
-        static_body.position = dynamic_body.position
-
-        static_shape = pymunk.Poly(static_body, shape.get_vertices())
-        static_shape.mass = 1
-        static_shape.color = shape.color
-        static_shape.user_data = shape.user_data
-        self.space.add(static_body, static_shape)
-
-
-    @property
-    def dynamic_bodies(self):
-        return [body for body in self.space.bodies if isinstance(body, pymunk.Body) and body.body_type != pymunk.Body.STATIC]
-
-    def _init_audio(self):
-        try:
-            self.sfx = {
-                'spawn': pyglet.media.StaticSource(pyfxr.explosion()),
-                'rotate': pyglet.media.StaticSource(pyfxr.explosion()),
-                'land': pyglet.media.StaticSource(pyfxr.explosion()),
-                'game_over': pyglet.media.StaticSource(pyfxr.explosion()),
-                # Hit sound for block-block collisions; small percussive pickup works well
-                'hit': pyglet.media.StaticSource(pyfxr.explosion()),
-            }
-            print("[audio] pyfxr sounds initialized")
-        except Exception as e:
-            print(f"[audio] init error: {e}")
-            self.sfx = {}
-
-    def _play_sfx(self, name: str):
+        self.draw_height()
+        if self.show_hud:
+            self.draw_hud()
+        prof.lap('text')
+        if prof.enabled:
+            self._count_world()
+            prof.end_frame()
+        if self.startup:
+            self.startup.append(("first frame", time.perf_counter() - lap))
+            self._report_startup()
+
+    def _report_startup(self):
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.startup)
+        print(f"[startup] {phases}; on screen after {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+        self.startup = None
+
+    def draw_height(self):
+        sim = self.sim
+        shown = (int(sim.tower_height), int(sim.best_height))
+        if shown != self._height_shown:
+            # Re-layout only when the numbers change
+            self._height_shown = shown
+            record = max(self.best_heights[:1] + [sim.best_height])
+            self.height_text.text = f"Height: {shown[0]}  Best: {shown[1]}  Record: {int(record)}"
+        self.height_text.draw()
+        if sim.leaning and not sim.game_over:
+            if self.lean_text is None:
+                self.lean_text = Text("Tower is leaning!", self.SCREEN_WIDTH / 2, self.SCREEN_HEIGHT - 30,
+                                      arcade.color.ORANGE, 18, anchor_x="center")
+            self.lean_text.draw()
+
+    def _count_world(self):
+        sim = self.sim
+        self.profiler.count('blocks', len(sim.registry))
+        self.profiler.count('shapes', sim.registry.shape_count)
+        self.profiler.count('awake', len(sim.settler.awake))
+        self.profiler.count('baked', len(sim.settler.baked))
+        self.profiler.count('contacts', len(sim._active_collisions))
+        self.profiler.count('floors', sim.metrics.max_depth)
+
+    def draw_hud(self):
+        """Profiling overlay: rolling avg / p95 / p99 per phase plus world counters."""
+        prof = self.profiler
+        if not self.hud_texts or prof.frames % self.HUD_REFRESH_FRAMES == 0:
+            lines = ["phase          avg    p95    p99 (ms)"]
+            for phase in ('frame',) + self.PROFILE_PHASES:
+                avg, p95, p99 = prof.stats(phase)
+                lines.append(f"{phase:<12}{avg:7.2f}{p95:7.2f}{p99:7.2f}")
+            lines.append("  ".join(f"{name} {value}" for name, value in prof.counters.items()))
+            self.hud_texts = [Text(line, 10, self.SCREEN_HEIGHT - 50 - i * 16, arcade.color.YELLOW, 11,
+                                   font_name=("Courier New", "Courier", "monospace"))
+                              for i, line in enumerate(lines)]
+        for text in self.hud_texts:
+            text.draw()
+
+    def _play_sfx(self, name: str, volume: float = 1.0):
         try:
-            snd = self.sfx.get(name) if hasattr(self, "sfx") else None
-            if snd:
-                snd.play()
+            self.sounds.play(name, volume)
         except Exception as e:
             print(f"[audio] play error for {name}: {e}")
 
 if __name__ == "__main__":
-    window = TowerTetris()
+    parser = argparse.ArgumentParser(description="SkyBox")
+    parser.add_argument("--endless", action="store_true", help="practice mode: no game over")
+    parser.add_argument("--trace", metavar="PATH", help="write per-frame timings to PATH (.jsonl or .csv)")
+    parser.add_argument("--seed", type=int, help="seed the block sequence (default: random)")
+    parser.add_argument("--record", metavar="PATH",
+                        default=os.path.join(os.path.dirname(__file__), ".cache", "last_session.skyrec"),
+                        help="where to write the session's input log (default: .cache/last_session.skyrec)")
+    parser.add_argument("--no-record", action="store_true", help="don't write an input log")
+    args = parser.parse_args()
+    window = TowerTetris(endless=args.endless, trace_path=args.trace,
+                         record_path=None if args.no_record else args.record, seed=args.seed)
     arcade.run()
+    window.stop_recording()
+    window.save_heights()
+    window.stop_solver()
+    window.profiler.close_trace()
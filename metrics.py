@@ -0,0 +1,205 @@
+import heapq
+
+import pymunk
+
+
+class _MaxIndex:
+    """Largest value over a changing set of keys: a heap with lazy deletion.
+
+    set() and discard() are O(log n) and O(1); replaced or discarded entries stay in the
+    heap until they reach the top, so max() is amortized O(1).
+    """
+
+    def __init__(self):
+        self._heap = []
+        # key -> sequence number of its live heap entry; also keeps keys out of comparisons
+        self._current = {}
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._current)
+
+    def set(self, key, value):
+        self._sequence += 1
+        self._current[key] = self._sequence
+        heapq.heappush(self._heap, (-value, self._sequence, key))
+        if len(self._heap) > 2 * len(self._current) + 64:
+            # Mostly dead entries: drop them so the heap can't grow without bound
+            current = self._current
+            self._heap = [entry for entry in self._heap if current.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+
+    def discard(self, key):
+        self._current.pop(key, None)
+
+    def max(self, default=None):
+        heap, current = self._heap, self._current
+        while heap and current.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        return -heap[0][0] if heap else default
+
+
+class TowerMetrics:
+    """Tower height, center of mass, lean and support depth, kept up to date incrementally.
+
+    Every placed block has a record that is only refreshed when the block lands, is baked,
+    drifts more than MOVE_DISTANCE / MOVE_ANGLE (track_motion) or is removed, so reading
+    the numbers for scoring or the HUD never scans the tower. Each refresh is O(log n):
+
+    - height: highest block top, from a max-heap with lazy deletion
+    - center_of_mass: running sums of m, m*x and m*y
+    - base: left/right extent of the blocks standing on the ground, heaps again
+    - depth: number of blocks from a block down to the ground, itself included; 1 on the
+      ground, 0 if nothing tracked holds it up. Found from the records of the blocks its
+      bounding box touches below its center, so blocks should be updated bottom-up
+      (refresh() sorts them). Drifting blocks keep the depth they had, it is only
+      looked up again when they land or bake.
+    """
+
+    MOVE_DISTANCE = 4.0  # px
+    MOVE_ANGLE = 0.05  # rad
+    SUPPORT_PADDING = 2.0
+
+    def __init__(self, space: pymunk.Space, registry, prefabs, ground_top):
+        self.space = space
+        self.blocks = registry.blocks
+        self.prefabs = prefabs
+        self.ground_top = ground_top
+        # body -> (x, y, angle, top, mass, cx, cy, left, right, depth)
+        self.records = {}
+        self._tops = _MaxIndex()
+        # Ground-level blocks; the left index holds -left so both are max-heaps
+        self._base_left = _MaxIndex()
+        self._base_right = _MaxIndex()
+        # depth -> number of blocks at that depth
+        self._depths = {}
+        self.max_depth = 0
+        self.mass = 0.0
+        self._mass_x = 0.0
+        self._mass_y = 0.0
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, body):
+        return body in self.records
+
+    @property
+    def height(self):
+        """Top of the highest tracked block (ground_top when there are none)."""
+        return self._tops.max(self.ground_top)
+
+    @property
+    def center_of_mass(self):
+        if not self.records:
+            return None
+        return self._mass_x / self.mass, self._mass_y / self.mass
+
+    @property
+    def base(self):
+        """(left, right) of the blocks standing on the ground, or None."""
+        if not len(self._base_right):
+            return None
+        return -self._base_left.max(), self._base_right.max()
+
+    @property
+    def lean(self):
+        """Horizontal offset of the center of mass from the middle of the base, in half base widths.
+
+        Beyond +-1 the tower's weight is no longer above its footprint on the ground.
+        """
+        base = self.base
+        if base is None or not self.records:
+            return 0.0
+        left, right = base
+        half_width = max((right - left) / 2, 1.0)
+        return (self._mass_x / self.mass - (left + right) / 2) / half_width
+
+    def top_of(self, body):
+        record = self.records.get(body)
+        return record[3] if record else None
+
+    def depth_of(self, body):
+        record = self.records.get(body)
+        return record[9] if record else 0
+
+    def update(self, body: pymunk.Body, depth=None):
+        """(Re)compute body's record from its current pose."""
+        shapes = self.blocks.get(body)
+        if shapes is None:
+            return
+        self.remove(body)
+        bb = shapes[0].cache_bb()
+        for shape in shapes[1:]:
+            bb = bb.merge(shape.cache_bb())
+        mass = self.prefabs[shapes[0].user_data['index']].mass
+        center = self._center(body)
+        if depth is None:
+            depth = self._support_depth(body, bb, center.y)
+        position = body.position
+        self.records[body] = (position.x, position.y, body.angle, bb.top, mass, center.x, center.y,
+                              bb.left, bb.right, depth)
+        self._tops.set(body, bb.top)
+        self.mass += mass
+        self._mass_x += mass * center.x
+        self._mass_y += mass * center.y
+        if depth == 1:
+            self._base_left.set(body, -bb.left)
+            self._base_right.set(body, bb.right)
+        if depth:
+            self._depths[depth] = self._depths.get(depth, 0) + 1
+            self.max_depth = max(self.max_depth, depth)
+
+    def refresh(self, bodies):
+        """Update many bodies, lowest first so depths build on each other."""
+        for body in sorted((body for body in bodies if body in self.blocks), key=lambda body: self._center(body).y):
+            self.update(body)
+
+    def track_motion(self, body: pymunk.Body):
+        """Update body if it isn't tracked yet or has moved noticeably since its last update."""
+        record = self.records.get(body)
+        if record is None:
+            self.update(body)
+            return
+        position = body.position
+        dx, dy = position.x - record[0], position.y - record[1]
+        if dx * dx + dy * dy >= self.MOVE_DISTANCE ** 2 or abs(body.angle - record[2]) >= self.MOVE_ANGLE:
+            self.update(body, record[9])
+
+    def remove(self, body: pymunk.Body):
+        record = self.records.pop(body, None)
+        if record is None:
+            return
+        _, _, _, _, mass, center_x, center_y, _, _, depth = record
+        self._tops.discard(body)
+        self._base_left.discard(body)
+        self._base_right.discard(body)
+        if self.records:
+            self.mass -= mass
+            self._mass_x -= mass * center_x
+            self._mass_y -= mass * center_y
+        else:
+            # Start from exact zeros again instead of accumulating rounding errors
+            self.mass = self._mass_x = self._mass_y = 0.0
+        if depth:
+            self._depths[depth] -= 1
+            if not self._depths[depth]:
+                del self._depths[depth]
+            while self.max_depth and self.max_depth not in self._depths:
+                self.max_depth -= 1
+
+    def _center(self, body):
+        # From the prefab: baked (static) bodies don't report a mass or center of gravity
+        return body.local_to_world(self.prefabs[self.blocks[body][0].user_data['index']].center_of_gravity)
+
+    def _support_depth(self, body, bb, center_y):
+        pad = self.SUPPORT_PADDING
+        if bb.bottom <= self.ground_top + pad:
+            return 1
+        below = 0
+        query = pymunk.BB(bb.left - pad, bb.bottom - pad, bb.right + pad, center_y)
+        for shape in self.space.bb_query(query, pymunk.ShapeFilter()):
+            record = self.records.get(shape.body)
+            if record is not None and shape.body is not body and record[6] < center_y:
+                below = max(below, record[9])
+        return below + 1 if below else 0
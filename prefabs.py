@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+
+import pymunk
+from pymunk.autogeometry import convex_decomposition
+
+
+class BlockPrefab:
+    """Everything needed to spawn one block type, computed once.
+
+    pieces are the scaled convex polygons (body-local), mass/moment/center_of_gravity
+    are what Pymunk would accumulate from those pieces at the catalog density, and
+    bb is the local (left, bottom, right, top) bounding box.
+    """
+
+    def __init__(self, index, pieces, mass, moment, center_of_gravity, color, bb):
+        self.index = index
+        self.pieces = pieces
+        self.mass = mass
+        self.moment = moment
+        self.center_of_gravity = center_of_gravity
+        self.color = color
+        self.bb = bb
+
+    def instantiate(self, position, friction, collision_type):
+        """Create a body plus its shapes at position. The caller adds them to the space."""
+        body = pymunk.Body(self.mass, self.moment)
+        body.center_of_gravity = self.center_of_gravity
+        body.position = position
+        shapes = []
+        for verts in self.pieces:
+            # Shapes stay massless: mass and moment were set on the body from the catalog
+            shape = pymunk.Poly(body, verts)
+            shape.user_data = {'index': self.index, 'color': self.color}
+            shape.friction = friction
+            shape.collision_type = collision_type
+            shapes.append(shape)
+        return body, shapes
+
+
+class PrefabCatalog:
+    """Block templates with their convex decomposition, mass and moment precomputed.
+
+    Decompositions are keyed by the scaled vertex list, so they can be persisted to
+    cache_path and reused on the next launch instead of calling convex_decomposition.
+    """
+
+    CACHE_VERSION = 1
+
+    def __init__(self, scale, density, friction=0.8, collision_type=0, cache_path=None):
+        self.scale = scale
+        self.density = density
+        self.friction = friction
+        self.collision_type = collision_type
+        self.cache_path = cache_path
+        self.prefabs = []
+        self._cache = {}
+        self._cache_dirty = False
+        self._load_cache()
+
+    def __len__(self):
+        return len(self.prefabs)
+
+    def __getitem__(self, index) -> BlockPrefab:
+        return self.prefabs[index]
+
+    def add_shape(self, verts, color=None) -> BlockPrefab:
+        index = len(self.prefabs)
+        scaled_verts = [(float(x) * self.scale, float(y) * self.scale) for (x, y) in verts]
+        pieces = self._decompose(scaled_verts)
+        mass, moment, cog = self._mass_properties(pieces)
+        if color is None:
+            color = self.default_color(index)
+        xs = [x for piece in pieces for x, _ in piece]
+        ys = [y for piece in pieces for _, y in piece]
+        prefab = BlockPrefab(index, pieces, mass, moment, cog, tuple(color), (min(xs), min(ys), max(xs), max(ys)))
+        self.prefabs.append(prefab)
+        return prefab
+
+    def add_shapes(self, shapes):
+        for verts in shapes:
+            self.add_shape(verts)
+
+    def load_file(self, path):
+        """Add block types from a JSON file.
+
+        The file holds a list of shapes, each either a bare vertex list or an object
+        with "verts" and an optional RGBA "color".
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for entry in data:
+            if isinstance(entry, dict):
+                self.add_shape(entry["verts"], entry.get("color"))
+            else:
+                self.add_shape(entry)
+
+    @staticmethod
+    def default_color(index):
+        r = min(100 + index * 50, 255)
+        g = min(int(150 + index ** 1.5), 255)
+        b = max(0, min(255 - index * 30, 255))
+        return (r, g, b, 255)
+
+    def instantiate(self, index, position):
+        return self.prefabs[index].instantiate(position, self.friction, self.collision_type)
+
+    def save_cache(self):
+        if not self.cache_path or not self._cache_dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.CACHE_VERSION, "pieces": self._cache}, f)
+            self._cache_dirty = False
+        except OSError as e:
+            print(f"[prefabs] Failed to write cache {self.cache_path}: {e}")
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.CACHE_VERSION:
+                self._cache = data.get("pieces", {})
+        except (OSError, ValueError) as e:
+            print(f"[prefabs] Ignoring unreadable cache {self.cache_path}: {e}")
+
+    def _decompose(self, scaled_verts):
+        key = hashlib.sha1(json.dumps(scaled_verts).encode("utf-8")).hexdigest()
+        pieces = self._cache.get(key)
+        if pieces is None:
+            pieces = [[(p.x, p.y) for p in piece] for piece in convex_decomposition(scaled_verts, 0)]
+            self._cache[key] = pieces
+            self._cache_dirty = True
+        return [[(float(x), float(y)) for x, y in piece] for piece in pieces]
+
+    def _mass_properties(self, pieces):
+        # Let Pymunk accumulate the body exactly as it would for shapes with density
+        space = pymunk.Space()
+        body = pymunk.Body()
+        shapes = [pymunk.Poly(body, verts) for verts in pieces]
+        for shape in shapes:
+            shape.density = self.density
+        space.add(body, *shapes)
+        return body.mass, body.moment, tuple(body.center_of_gravity)
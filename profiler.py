@@ -0,0 +1,107 @@
+import csv
+import json
+import time
+from collections import deque
+
+perf_counter = time.perf_counter
+
+
+class FrameProfiler:
+    """Per-frame phase timings and counters with rolling statistics.
+
+    Code under measurement calls start() once and then lap(phase) after each phase,
+    which adds the time since the previous mark to that phase for the current frame.
+    end_frame() closes the frame, feeds the rolling history and, if a trace is open,
+    writes one JSON-lines or CSV record.
+
+    While disabled every method returns after a single attribute check, so the calls
+    can stay in production code.
+    """
+
+    HISTORY = 240  # frames kept for averages and percentiles
+
+    def __init__(self, phases, history=HISTORY):
+        self.phases = list(phases)
+        self.enabled = False
+        self.frames = 0
+        self.counters = {}
+        self._current = dict.fromkeys(self.phases, 0.0)
+        self._history = {phase: deque(maxlen=history) for phase in self.phases + ["frame"]}
+        self._mark = 0.0
+        self._last_frame_end = None
+        self._trace_file = None
+        self._trace_csv = None
+
+    def start(self):
+        if self.enabled:
+            self._mark = perf_counter()
+
+    def lap(self, phase):
+        if self.enabled:
+            now = perf_counter()
+            self._current[phase] += now - self._mark
+            self._mark = now
+
+    def add(self, phase, seconds):
+        if self.enabled:
+            self._current[phase] += seconds
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counters[name] = value
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        now = perf_counter()
+        frame_time = now - self._last_frame_end if self._last_frame_end is not None else 0.0
+        self._last_frame_end = now
+        self.frames += 1
+        current = self._current
+        for phase, seconds in current.items():
+            self._history[phase].append(seconds)
+        self._history["frame"].append(frame_time)
+        if self._trace_file:
+            self._write_trace(frame_time)
+        self._current = dict.fromkeys(self.phases, 0.0)
+
+    def stats(self, phase):
+        """Rolling (average, p95, p99) of a phase in milliseconds."""
+        samples = self._history.get(phase)
+        if not samples:
+            return 0.0, 0.0, 0.0
+        ordered = sorted(samples)
+        last = len(ordered) - 1
+        return (sum(ordered) / len(ordered) * 1000.0,
+                ordered[int(last * 0.95)] * 1000.0,
+                ordered[int(last * 0.99)] * 1000.0)
+
+    @property
+    def tracing(self):
+        return self._trace_file is not None
+
+    def open_trace(self, path):
+        """Stream every following frame to path: CSV if it ends in .csv, JSON lines otherwise."""
+        self.close_trace()
+        self._trace_file = open(path, "w", encoding="utf-8", newline="")
+        self._trace_csv = None
+        if path.lower().endswith(".csv"):
+            self._trace_csv = csv.writer(self._trace_file)
+        self.enabled = True
+
+    def close_trace(self):
+        if self._trace_file:
+            self._trace_file.close()
+        self._trace_file = None
+        self._trace_csv = None
+
+    def _write_trace(self, frame_time):
+        record = {"frame": self.frames, "frame_ms": frame_time * 1000.0}
+        record.update((phase + "_ms", seconds * 1000.0) for phase, seconds in self._current.items())
+        record.update(self.counters)
+        if self._trace_csv is None:
+            self._trace_file.write(json.dumps(record) + "\n")
+            return
+        if self._trace_file.tell() == 0:
+            self._trace_csv.writerow(record.keys())
+        self._trace_csv.writerow(record.values())
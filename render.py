@@ -0,0 +1,214 @@
+import math
+
+import arcade
+import pymunk
+from arcade.shape_list import ShapeElementList, create_line
+from PIL import Image, ImageDraw
+
+
+class BlockRenderer:
+    """Retained renderer for the Pymunk world.
+
+    Every block gets one sprite whose texture is rasterized once per shape type,
+    so a frame only has to copy each moving body's position/angle onto its sprite
+    and issue a single batched draw. Sprites of baked (static) blocks are left
+    alone. Static segments (ground, walls) are uploaded once into their own
+    ShapeElementList and only rebuilt when the walls grow.
+
+    Once set_view() is called, only blocks found by a space.bb_query of the view
+    (plus CULL_MARGIN) are in the sprite list, so both updating and drawing cost
+    depend on what is on screen rather than on the size of the tower. The query
+    is only repeated when the view leaves the margin, blocks come or go, or every
+    CULL_REFRESH_FRAMES frames for blocks that move into view by themselves.
+    """
+
+    LINE_WIDTH = 3
+    TEXTURE_PADDING = 2
+    CULL_MARGIN = 150.0
+    CULL_REFRESH_FRAMES = 10
+
+    def __init__(self):
+        self.block_sprites = arcade.SpriteList(lazy=True)
+        self.static_shapes = ShapeElementList()
+        # body -> (sprite, local center of the sprite texture)
+        self._sprites = {}
+        # Same, for bodies that don't move and are skipped by update()
+        self._frozen = {}
+        # shape index -> (texture, local center)
+        self._textures = {}
+        # Space to cull with; set by the owner
+        self.space = None
+        # Bodies whose sprite is in block_sprites, and the moving ones among them
+        self._shown = {}
+        self._moving = {}
+        self._cull_bb = None
+        self._cull_age = 0
+
+    def clear(self):
+        self.block_sprites.clear()
+        self.static_shapes = ShapeElementList()
+        self._sprites.clear()
+        self._frozen.clear()
+        self._shown.clear()
+        self._moving.clear()
+        self._cull_bb = None
+
+    def set_static(self, shapes):
+        self.static_shapes = ShapeElementList()
+        for shape in shapes:
+            self.add_static(shape)
+
+    def add_static(self, shape: pymunk.Shape):
+        # Only segments are static in this game; sensors (death line) stay invisible
+        if not isinstance(shape, pymunk.Segment):
+            return
+        if shape.sensor or (shape.user_data and shape.user_data.get("sensor")):
+            return
+        color = shape.user_data.get("color") if shape.user_data else arcade.color.WHITE
+        self.static_shapes.append(create_line(shape.a.x, shape.a.y, shape.b.x, shape.b.y, color, self.LINE_WIDTH))
+
+    def add_block(self, body: pymunk.Body):
+        shapes = list(body.shapes)
+        texture, center = self._block_texture(shapes[0].user_data['index'], shapes)
+        sprite = arcade.Sprite(texture)
+        self._sprites[body] = (sprite, center)
+        self._place(sprite, center, body)
+        # Shown until the next cull says otherwise
+        self.block_sprites.append(sprite)
+        self._shown[body] = None
+        self._moving[body] = self._sprites[body]
+        self._cull_bb = None
+        return sprite
+
+    def remove_block(self, body: pymunk.Body):
+        entry = self._sprites.pop(body, None) or self._frozen.pop(body, None)
+        self._moving.pop(body, None)
+        if self._shown.pop(body, 0) is None:
+            self.block_sprites.remove(entry[0])
+
+    def freeze_block(self, body: pymunk.Body):
+        entry = self._sprites.pop(body, None)
+        if entry:
+            self._place(entry[0], entry[1], body)
+            self._frozen[body] = entry
+            self._moving.pop(body, None)
+
+    def thaw_block(self, body: pymunk.Body):
+        entry = self._frozen.pop(body, None)
+        if entry:
+            self._sprites[body] = entry
+            if body in self._shown:
+                self._moving[body] = entry
+
+    def set_view(self, left, bottom, right, top):
+        """Cull to the world rectangle that is on screen this frame."""
+        bb = self._cull_bb
+        self._cull_age += 1
+        if bb is not None and self._cull_age < self.CULL_REFRESH_FRAMES \
+                and bb.left <= left and bb.bottom <= bottom and bb.right >= right and bb.top >= top:
+            return  # Still inside the margin of the last query
+        margin = self.CULL_MARGIN
+        self._cull(pymunk.BB(left - margin, bottom - margin, right + margin, top + margin))
+
+    def _cull(self, bb):
+        visible = {}
+        for shape in self.space.bb_query(bb, pymunk.ShapeFilter()):
+            body = shape.body
+            if body in self._sprites or body in self._frozen:
+                visible[body] = None
+        for body in [body for body in self._shown if body not in visible]:
+            del self._shown[body]
+            self._moving.pop(body, None)
+            entry = self._sprites.get(body) or self._frozen[body]
+            self.block_sprites.remove(entry[0])
+        for body in visible:
+            if body in self._shown:
+                continue
+            self._shown[body] = None
+            entry = self._sprites.get(body)
+            if entry:
+                self._moving[body] = entry
+            else:
+                entry = self._frozen[body]
+            self.block_sprites.append(entry[0])
+        self._cull_bb = bb
+        self._cull_age = 0
+
+    def update(self, alpha=1.0, previous=None):
+        """Copy physics transforms onto the sprites; geometry itself never changes.
+
+        previous maps body -> (position, angle) from the tick before the current one;
+        bodies found there are drawn alpha of the way from that state to the current one.
+        """
+        if not previous or alpha >= 1.0:
+            for body, (sprite, center) in self._moving.items():
+                self._place(sprite, center, body)
+            return
+        for body, (sprite, center) in self._moving.items():
+            prev = previous.get(body)
+            if prev is None:
+                self._place(sprite, center, body)
+                continue
+            position = prev[0].interpolate_to(body.position, alpha)
+            angle = prev[1] + (body.angle - prev[1]) * alpha
+            x, y = position + pymunk.Vec2d(*center).rotated(angle)
+            sprite.position = (x, y)
+            sprite.angle = -math.degrees(angle)
+
+    def draw(self):
+        self.static_shapes.draw()
+        self.block_sprites.draw()
+
+    @staticmethod
+    def draw_ghost(prefab, pose):
+        """Outline of a block of type prefab at pose (x, y, angle), for placement hints."""
+        x, y, angle = pose
+        cos, sin = math.cos(angle), math.sin(angle)
+        for piece in prefab.pieces:
+            points = [(x + vx * cos - vy * sin, y + vx * sin + vy * cos) for vx, vy in piece]
+            arcade.draw_polygon_outline(points, (255, 255, 255, 160), 2)
+
+    @staticmethod
+    def draw_wireframe(geometry, view, skyline=None):
+        """Debug overlay: the physics polygons in view, straight from the vertex buffer, and the skyline."""
+        lines = geometry.lines(view)
+        if len(lines):
+            arcade.draw_lines(lines.tolist(), arcade.color.CYAN, 1)
+        if skyline is not None:
+            left, right, heights = skyline
+            step = (right - left) / len(heights)
+            points = []
+            for i, height in enumerate(heights.tolist()):
+                points += [(left + i * step, height), (left + (i + 1) * step, height)]
+            arcade.draw_line_strip(points, arcade.color.ORANGE, 2)
+
+    @staticmethod
+    def _place(sprite, center, body):
+        x, y = body.local_to_world(center)
+        sprite.position = (x, y)
+        # Arcade sprite angles are clockwise degrees, Pymunk angles counter-clockwise radians
+        sprite.angle = -math.degrees(body.angle)
+
+    def _block_texture(self, shape_index, shapes):
+        cached = self._textures.get(shape_index)
+        if cached:
+            return cached
+        polys = [(shape.get_vertices(), shape.user_data.get("color") if shape.user_data else arcade.color.WHITE)
+                 for shape in shapes if isinstance(shape, pymunk.Poly)]
+        xs = [v.x for verts, _ in polys for v in verts]
+        ys = [v.y for verts, _ in polys for v in verts]
+        min_x, max_x, min_y, max_y = min(xs), max(xs), min(ys), max(ys)
+        pad = self.TEXTURE_PADDING
+        width = int(math.ceil(max_x - min_x)) + pad * 2
+        height = int(math.ceil(max_y - min_y)) + pad * 2
+        image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        for verts, color in polys:
+            # Image rows grow downwards, world y grows upwards
+            draw.polygon([(v.x - min_x + pad, max_y - v.y + pad) for v in verts], fill=tuple(color))
+        texture = arcade.Texture(image, hash=f"skybox-block-{shape_index}",
+                                 hit_box_algorithm=arcade.hitbox.algo_bounding_box)
+        # Sprite centers sit on the middle of the padded image, i.e. the middle of the local bbox
+        center = ((min_x + max_x) / 2, (min_y + max_y) / 2)
+        self._textures[shape_index] = (texture, center)
+        return texture, center
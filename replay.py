@@ -0,0 +1,196 @@
+"""Session input logs and fast headless replay.
+
+A log is a small header (seed, tick length, world size, ...) followed by one 5-byte
+record per press or release, stamped with the number of ticks the simulation had run
+when it happened. Feeding those records into a SkyboxSim built from the header, at
+the same ticks, reproduces the whole session. Replay needs no window or audio and
+runs as fast as the physics allows:
+
+    python main.py --record session.skyrec
+    python replay.py session.skyrec
+    python replay.py session.skyrec --profile --trace replay.jsonl
+"""
+import argparse
+import os
+import struct
+import sys
+
+from profiler import FrameProfiler, perf_counter
+from sim import SkyboxSim, CMD_LEFT, CMD_RIGHT, CMD_DROP, CMD_ROTATE, CMD_UNDO, CMD_CHECKPOINT
+
+MAGIC = b"SKYR"
+VERSION = 1
+# magic, version, flags, seed, fixed_dt, substeps, width, height, prefab count
+HEADER = struct.Struct("<4sBBqdHHHH")
+# tick, code: command index, | RELEASE for a release, or END
+RECORD = struct.Struct("<IB")
+# written after the END record: final score, blocks placed
+RESULT = struct.Struct("<II")
+# Append only: a command's index is its code in the log
+COMMANDS = (CMD_LEFT, CMD_RIGHT, CMD_DROP, CMD_ROTATE, CMD_UNDO, CMD_CHECKPOINT)
+RELEASE = 0x80
+END = 0xFF
+FLAG_ENDLESS = 1
+
+
+class InputRecorder:
+    """Writes a session log; attach it as sim.recorder and close() it when the session ends."""
+
+    def __init__(self, path, sim):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, FLAG_ENDLESS if sim.endless else 0, sim.seed, sim.FIXED_DT,
+                                     sim.SUBSTEPS, sim.width, sim.height, len(sim.prefabs)))
+
+    def record(self, tick, command, pressed):
+        self._file.write(RECORD.pack(tick, COMMANDS.index(command) | (0 if pressed else RELEASE)))
+
+    def close(self, sim):
+        """Finish the log with the final tick and result, so a replay can check it got the same."""
+        if self._file is None:
+            return
+        self._file.write(RECORD.pack(sim.steps, END))
+        self._file.write(RESULT.pack(sim.score, sim.blocks_placed))
+        self._file.close()
+        self._file = None
+
+
+class InputLog:
+    """A parsed session log. events is a list of (tick, command, pressed)."""
+
+    def __init__(self, seed, fixed_dt, substeps, width, height, endless, prefab_count):
+        self.seed = seed
+        self.fixed_dt = fixed_dt
+        self.substeps = substeps
+        self.width = width
+        self.height = height
+        self.endless = endless
+        self.prefab_count = prefab_count
+        self.events = []
+        # Only known when the recording was closed properly
+        self.end_tick = None
+        self.score = None
+        self.blocks_placed = None
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path}: not a SkyBox session log")
+        magic, version, flags, seed, fixed_dt, substeps, width, height, prefab_count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a SkyBox session log")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported log version {version}")
+        log = cls(seed, fixed_dt, substeps, width, height, bool(flags & FLAG_ENDLESS), prefab_count)
+        offset = HEADER.size
+        # A truncated log (the game crashed) still replays up to its last complete record
+        while offset + RECORD.size <= len(data):
+            tick, code = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            if code == END:
+                log.end_tick = tick
+                if offset + RESULT.size <= len(data):
+                    log.score, log.blocks_placed = RESULT.unpack_from(data, offset)
+                break
+            log.events.append((tick, COMMANDS[code & ~RELEASE], not code & RELEASE))
+        return log
+
+    @property
+    def last_tick(self):
+        if self.end_tick is not None:
+            return self.end_tick
+        return self.events[-1][0] if self.events else 0
+
+    def new_sim(self, prefabs=None, listener=None, profiler=None):
+        """A simulation in the same starting state as the recorded one."""
+        sim = SkyboxSim(self.width, self.height, prefabs=prefabs, listener=listener, endless=self.endless,
+                        profiler=profiler, seed=self.seed)
+        if len(sim.prefabs) != self.prefab_count:
+            print(f"[replay] warning: recorded with {self.prefab_count} block types, "
+                  f"{len(sim.prefabs)} available now; replay will diverge")
+        sim.FIXED_DT = self.fixed_dt
+        sim.SUBSTEPS = self.substeps
+        return sim
+
+
+class InputPlayer:
+    """Feeds a log's events into a simulation; call apply(sim) before every sim.step()."""
+
+    def __init__(self, log):
+        self.events = log.events
+        self.index = 0
+
+    def apply(self, sim):
+        events = self.events
+        while self.index < len(events) and events[self.index][0] <= sim.steps:
+            _, command, pressed = events[self.index]
+            if pressed:
+                sim.press(command)
+            else:
+                sim.release(command)
+            self.index += 1
+
+
+def game_prefabs():
+    """The game's block catalog, including any extra blocks from the data file."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return SkyboxSim.build_prefabs(cache_path=os.path.join(base_dir, ".cache", "prefabs.json"),
+                                   blocks_path=os.path.join(base_dir, "assets", "data", "blocks.json"))
+
+
+def replay(log, sim, ticks=None):
+    """Run sim through the log (and up to `ticks` in total, if given) as fast as possible."""
+    player = InputPlayer(log)
+    end = ticks if ticks is not None else log.last_tick
+    profiler = sim.profiler
+    while sim.steps < end and not sim.game_over:
+        player.apply(sim)
+        sim.step()
+        profiler.end_frame()
+    return sim
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded SkyBox session without a window")
+    parser.add_argument("log", help="session log written by main.py --record")
+    parser.add_argument("--ticks", type=int, help="run this many ticks instead of stopping where the recording did")
+    parser.add_argument("--profile", action="store_true", help="print per-phase tick timings")
+    parser.add_argument("--trace", metavar="PATH", help="write per-tick timings to PATH (.jsonl or .csv)")
+    args = parser.parse_args(argv)
+
+    log = InputLog.read(args.log)
+    profiler = FrameProfiler(SkyboxSim.PROFILE_PHASES, history=max(log.last_tick, args.ticks or 0, 1))
+    profiler.enabled = args.profile
+    if args.trace:
+        profiler.open_trace(args.trace)
+    sim = log.new_sim(prefabs=game_prefabs(), profiler=profiler)
+
+    start = perf_counter()
+    replay(log, sim, args.ticks)
+    elapsed = perf_counter() - start
+    profiler.close_trace()
+
+    simulated = sim.steps * sim.FIXED_DT
+    print(f"[replay] {sim.steps} ticks ({simulated:.1f}s of play) in {elapsed:.2f}s, "
+          f"{simulated / elapsed if elapsed else 0.0:.0f}x real time")
+    print(f"[replay] score {sim.score}, {sim.blocks_placed} blocks placed, {len(sim.registry)} in play"
+          f"{', game over' if sim.game_over else ''}")
+    if profiler.enabled:
+        for phase in ("frame",) + SkyboxSim.PROFILE_PHASES:
+            avg, p95, p99 = profiler.stats(phase)
+            print(f"[replay] {phase:<10} avg {avg:.3f} ms  p95 {p95:.3f} ms  p99 {p99:.3f} ms")
+    if log.score is not None and args.ticks is None:
+        if (sim.score, sim.blocks_placed) != (log.score, log.blocks_placed):
+            print(f"[replay] MISMATCH: recording ended with score {log.score}, {log.blocks_placed} blocks placed")
+            return 1
+        print("[replay] matches the recording")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import pymunk
+
+
+class TowerSettler:
+    """Bakes blocks that have come to rest into static bodies, and thaws them on impact.
+
+    Static bodies cost the solver nothing, so once the lower floors of a tower settle
+    the per-step cost only depends on the handful of blocks still moving near the top.
+
+    Baking happens bottom-up: a block is only baked once everything it rests on is
+    static (ground or already baked). Thawing therefore cascades upwards, so a baked
+    block never ends up floating on top of one that moves again. A block wedged in by
+    steep side contacts has no supporting contact at all; once it has rested for
+    WEDGED_TIME it is baked anyway if everything it touches is static or resting too,
+    so it can't keep the whole tower above it awake.
+    """
+
+    REST_SPEED = 5.0  # px/s
+    REST_ANGULAR_SPEED = 0.1  # rad/s
+    REST_TIME = 1.0  # seconds a block must stay at rest before it is baked
+    SUPPORT_RETRY = 0.25  # seconds a resting block waits before re-checking what it stands on
+    WEDGED_TIME = 3.0  # seconds at rest after which any contacts count as support
+    WAKE_SPEED = 60.0  # approach speed (px/s) an impact needs to thaw a baked block
+    SUPPORT_NORMAL_Y = -0.3  # contacts pointing at least this much downwards count as support
+    NEIGHBOR_PADDING = 2.0
+
+    def __init__(self, space: pymunk.Space):
+        self.space = space
+        # Dynamic blocks that may still settle: body -> seconds spent at rest (uninterrupted)
+        self.awake = {}
+        # Baked blocks: body -> (mass, moment, center_of_gravity) to restore when thawed
+        self.baked = {}
+        # Bumped whenever the set of baked blocks changes, so snapshots can tell when to rebuild
+        self.generation = 0
+        self.on_bake = None
+        self.on_thaw = None
+
+    def track(self, body: pymunk.Body):
+        self.awake[body] = 0.0
+
+    def untrack(self, body: pymunk.Body):
+        self.awake.pop(body, None)
+        if self.baked.pop(body, None) is not None:
+            self.generation += 1
+
+    def update(self, dt, exclude=None):
+        """Advance rest timers after a physics tick and bake blocks that stayed still."""
+        ready = []
+        rest_time, retry = self.REST_TIME, self.SUPPORT_RETRY
+        for body, rest in self.awake.items():
+            if body is exclude:
+                continue
+            if body.velocity.length < self.REST_SPEED and abs(body.angular_velocity) < self.REST_ANGULAR_SPEED:
+                previous = rest
+                rest += dt
+                # Check its supports on reaching REST_TIME, then every SUPPORT_RETRY, not on every tick
+                if rest >= rest_time and (previous < rest_time or
+                                          int((rest - rest_time) / retry) != int((previous - rest_time) / retry)):
+                    ready.append((body, rest))
+            else:
+                rest = 0.0
+            self.awake[body] = rest
+        for body, rest in ready:
+            if self._rests_on_static(body) or (rest >= self.WEDGED_TIME and self._wedged(body)):
+                self.bake(body)
+
+    def bake(self, body: pymunk.Body):
+        self.awake.pop(body, None)
+        self.baked[body] = (body.mass, body.moment, body.center_of_gravity)
+        self.generation += 1
+        body.velocity = (0, 0)
+        body.angular_velocity = 0
+        body.body_type = pymunk.Body.STATIC
+        if self.on_bake:
+            self.on_bake(body)
+
+    def thaw(self, body: pymunk.Body, cascade=True):
+        """Turn a baked block back into a dynamic one, along with every baked block it supports."""
+        pending = [body]
+        while pending:
+            body = pending.pop()
+            props = self.baked.pop(body, None)
+            if props is None:
+                continue
+            self.generation += 1
+            position, angle = body.position, body.angle
+            body.body_type = pymunk.Body.DYNAMIC
+            # Shapes are massless, so switching type leaves the body weightless until restored
+            body.mass, body.moment, body.center_of_gravity = props
+            body.position, body.angle = position, angle
+            self.awake[body] = 0.0
+            if self.on_thaw:
+                self.on_thaw(body)
+            if cascade:
+                pending.extend(self._baked_above(body))
+
+    def on_impact(self, arbiter: pymunk.Arbiter, speed):
+        """Call from a block/block begin callback; thaws a baked block hit hard enough."""
+        if speed < self.WAKE_SPEED:
+            return
+        a, b = arbiter.shapes
+        baked = a.body if a.body in self.baked else b.body
+        if baked in self.baked:
+            # Body types can't change while the space is stepping
+            self.space.add_post_step_callback(lambda space, key: self.thaw(key), baked)
+
+    def _rests_on_static(self, body):
+        supports = []
+
+        def visit(arbiter):
+            # each_arbiter puts this body's shape first; the normal points from it to the other shape
+            if arbiter.normal.y < self.SUPPORT_NORMAL_Y:
+                supports.append(arbiter.shapes[1].body)
+
+        body.each_arbiter(visit)
+        return bool(supports) and all(support.body_type == pymunk.Body.STATIC for support in supports)
+
+    def _wedged(self, body):
+        # Every contact, whatever its direction, is with something static or resting as well
+        touching = []
+        body.each_arbiter(lambda arbiter: touching.append(arbiter.shapes[1].body))
+        return bool(touching) and all(other.body_type == pymunk.Body.STATIC or
+                                      self.awake.get(other, 0.0) >= self.REST_TIME for other in touching)
+
+    def _baked_above(self, body):
+        center_y = body.local_to_world(body.center_of_gravity).y
+        # One query over the whole block: body.shapes is a set in memory-address order, and
+        # anything that depends on its order (like the thaw order) would make runs irreproducible
+        shapes = iter(body.shapes)
+        bb = next(shapes).cache_bb()
+        for shape in shapes:
+            bb = bb.merge(shape.cache_bb())
+        pad = self.NEIGHBOR_PADDING
+        query = pymunk.BB(bb.left - pad, bb.bottom - pad, bb.right + pad, bb.top + pad)
+        # Ordered (a dict, not a set of bodies) for the same reason
+        above = {}
+        for other in self.space.bb_query(query, pymunk.ShapeFilter()):
+            neighbor = other.body
+            if neighbor is not body and neighbor in self.baked \
+                    and neighbor.local_to_world(neighbor.center_of_gravity).y >= center_y:
+                above[neighbor] = None
+        return above
@@ -0,0 +1,637 @@
+import heapq
+import math
+import os
+import random
+from collections import deque
+
+import pymunk
+
+from geometry import VertexBuffer
+from lifecycle import BlockRegistry
+from metrics import TowerMetrics
+from prefabs import PrefabCatalog
+from profiler import FrameProfiler, perf_counter
+from settle import TowerSettler
+from snapshot import SnapshotStore, WorldSnapshot
+
+# Player commands. Movement commands act while held, the others act once per press.
+CMD_LEFT = "left"
+CMD_RIGHT = "right"
+CMD_DROP = "drop"
+CMD_ROTATE = "rotate"
+CMD_UNDO = "undo"
+CMD_CHECKPOINT = "checkpoint"
+
+WHITE = (255, 255, 255, 255)
+
+
+class SkyboxSim:
+    """Window-free SkyBox game logic.
+
+    Owns the pymunk.Space, spawning, landing detection, scoring and the death sensor.
+    Input arrives as plain commands through press()/release(). The world always
+    advances in fixed FIXED_DT ticks (step()); on_update(dt) feeds real frame time
+    into an accumulator and runs however many ticks are due, so physics cost and
+    behaviour don't depend on the display refresh rate.
+
+    Blocks that come to rest are baked into static bodies by a TowerSettler, so the
+    solver only works on the part of the tower that is still moving. Blocks that
+    leave the world bounds are removed by a BlockRegistry; that ends the game just like
+    the death sensor does. With endless=True neither ends the game and lost blocks are
+    simply reaped.
+
+    Runs are reproducible: block choice comes from a seeded random.Random, and a
+    recorder (see replay.py) can log every press()/release() with the tick it came
+    before, which is all that is needed to replay a session.
+
+    The world is as wide as width but has no ceiling: tower_top tracks the highest block
+    (read from a TowerMetrics index, see metrics.py), blocks spawn SPAWN_CLEARANCE above
+    it and the side walls grow in screen-sized steps to stay ahead of it (reported as a
+    'walls' event). The same index drives height scoring, best_height and the 'lean'
+    warning, raised when the tower's center of mass drifts LEAN_WARNING half base widths
+    off its footprint.
+
+    The world is snapshotted (see snapshot.py) every time a block spawns, which is what
+    undo() rolls back to; every CHECKPOINT_EVERY placed blocks one of those snapshots
+    is also kept as a checkpoint for restore_checkpoint().
+
+    Anything a frontend should react to (sounds, new blocks, game over) is reported
+    through listener(event, value). Block hits are queued during physics and flushed
+    once per on_update, keeping only the MAX_HITS_PER_FRAME loudest.
+    """
+
+    WIDTH = 800
+    HEIGHT = 600
+    BLOCK_SCALE = 1.8
+    BLOCK_FRICTION = 0.8
+    GRAVITY = -200  # Slower gravity
+    # Seconds between a landing and the next spawn; shortened by SPAWN_DELAY_STEP every
+    # SPAWN_RAMP_BLOCKS placed blocks, down to MIN_SPAWN_DELAY
+    SPAWN_DELAY = 2.0
+    SPAWN_DELAY_STEP = 0.2
+    SPAWN_RAMP_BLOCKS = 10
+    MIN_SPAWN_DELAY = 0.5
+    FIXED_DT = 1 / 60
+    SUBSTEPS = 1  # space.step calls per tick, each FIXED_DT / SUBSTEPS long
+    MAX_STEPS_PER_FRAME = 5  # catch-up cap so a long frame can't spiral
+    COL_BLOCK = 1
+    COL_DEATH = 2
+    DEATH_Y = -150
+    WALL_THICKNESS = 20
+    SPAWN_CLEARANCE = 300  # how far above the tower top new blocks appear, once the tower is tall
+    TOWER_CHECK_TICKS = 10  # ticks between tower metrics checks of a moving block (a share of them each tick)
+    HEIGHT_POINTS_PX = 25  # a landing scores one extra point per this many px above the ground
+    LEAN_WARNING = 0.6
+    WORLD_MARGIN = 200  # how far past the walls / death sensor a block may go before it is removed
+    REAP_CHECK_TICKS = 10  # ticks between bounds checks of a moving block (a share of them each tick)
+    # Phases timed by the profiler; 'physics' is the whole space.step and includes 'callbacks'
+    PROFILE_PHASES = ('input', 'physics', 'callbacks', 'landing', 'settle')
+    UNDO_DEPTH = 20  # spawn snapshots kept for undo
+    CHECKPOINT_EVERY = 10  # placed blocks between checkpoints
+    CHECKPOINTS_KEPT = 5
+    MAX_HITS_PER_FRAME = 3
+    HIT_FULL_VOLUME_SPEED = 300.0  # impact speed (px/s) that plays the hit sound at full volume
+    BLOCK_SHAPES = [
+        # Rectangle
+        [(-20, -10), (20, -10), (20, 10), (-20, 10), (-20, -10)],
+        # L-shape
+        [(-20, -20), (20, -20), (20, 0), (0, 0), (0, 20), (-20, 20), (-20, -20)],
+        # Penthouse-like
+        [(-15, -15), (15, -15), (15, 15), (-15, 15), (-10, 10), (10, 10), (10, 20), (-10, 20), (-15, -15)],
+        # T-shape
+        [(-10, -10), (10, -10), (0, 10), (-10, 10), (10, 10), (-10, -10)],
+
+    ]
+
+    def __init__(self, width=WIDTH, height=HEIGHT, prefabs=None, listener=None, endless=False, profiler=None,
+                 seed=None):
+        self.width = width
+        self.height = height
+        self.endless = endless
+        self.profiler = profiler if profiler is not None else FrameProfiler(self.PROFILE_PHASES)
+        self.prefabs = prefabs if prefabs is not None else self.build_prefabs()
+        self.listener = listener
+        # Block choice comes from this generator only, so a seed reproduces the block sequence
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+        self.rng = random.Random(self.seed)
+        # Optional input log: recorder.record(tick, command, pressed) on every press/release
+        self.recorder = None
+        self.space = None
+        self.settler = None
+        self.registry = None
+        # Held commands in press order (a dict, so applying them doesn't depend on string hashing)
+        self.held = {}
+        self.falling_block = None
+        self.score = 0
+        self.last_shape_index = None
+        self.combo_multiplier = 1
+        self.game_over = False
+        self.blocks_placed = 0
+        self.spawn_delay = self.SPAWN_DELAY
+        self.time_since_last_land = 0.0
+        self.steps = 0
+        self.tower_top = float(self.WALL_THICKNESS)  # top of the ground until something lands
+        self.best_height = 0.0  # highest tower_top so far, above the ground
+        self.leaning = False
+        self.metrics = None
+        self._restoring = False
+        self.wall_top = self.height + 100
+        self.walls = ()
+        self.static_shapes = ()
+        self.render_alpha = 1.0
+        # body -> (position, angle) before the last tick, for render interpolation
+        self.previous_transforms = {}
+        self._accumulator = 0.0
+        # Block/block contacts currently touching: interned pair key (see _contact_key) -> shapes
+        self._active_collisions = {}
+        self._hit_queue = []
+        self._next_contact_id = 0
+        self.snapshots = None
+        self.history = None
+        self.checkpoints = None
+        self.setup()
+
+    @classmethod
+    def build_prefabs(cls, cache_path=None, blocks_path=None):
+        """Build the block catalog from BLOCK_SHAPES plus an optional JSON data file."""
+        prefabs = PrefabCatalog(cls.BLOCK_SCALE, cls.BLOCK_SCALE ** 2, friction=cls.BLOCK_FRICTION,
+                                collision_type=cls.COL_BLOCK, cache_path=cache_path)
+        prefabs.add_shapes(cls.BLOCK_SHAPES)
+        if blocks_path and os.path.exists(blocks_path):
+            try:
+                prefabs.load_file(blocks_path)
+                print(f"[prefabs] Loaded extra blocks: {blocks_path}")
+            except Exception as e:
+                print(f"[prefabs] Failed to load {blocks_path}: {e}")
+        prefabs.save_cache()
+        return prefabs
+
+    def _emit(self, event, value=None):
+        if self.listener:
+            self.listener(event, value)
+
+    def setup(self):
+        self.space = pymunk.Space()
+        self.space.gravity = (0, self.GRAVITY)
+        self.settler = TowerSettler(self.space)
+        self.settler.on_bake = self._on_block_baked
+        self.settler.on_thaw = lambda body: self._emit('block_thawed', body)
+        self.registry = BlockRegistry(self.space, pymunk.BB(-self.WORLD_MARGIN, self.DEATH_Y - self.WORLD_MARGIN,
+                                                            self.width + self.WORLD_MARGIN, math.inf))
+        self.registry.on_remove = self._on_block_removed
+        self.metrics = TowerMetrics(self.space, self.registry, self.prefabs, float(self.WALL_THICKNESS))
+        # All block vertices in world space, for debug drawing and height queries
+        self.geometry = VertexBuffer(self.settler.awake)
+
+        # Ground
+        wall_thickness = self.WALL_THICKNESS
+        ground_body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        ground_shape = pymunk.Segment(ground_body, (wall_thickness, 0), (self.width - wall_thickness, 0), wall_thickness)
+        ground_shape.friction = 1.0  # High friction for ground
+        ground_shape.user_data = {'color': WHITE}
+        self.space.add(ground_body, ground_shape)
+
+        # Side walls
+        left_wall = pymunk.Body(body_type=pymunk.Body.STATIC)
+        left_shape = pymunk.Segment(left_wall, (0, 0), (0, self.wall_top), wall_thickness)
+        left_shape.user_data = {'color': WHITE}
+        self.space.add(left_wall, left_shape)
+
+        right_wall = pymunk.Body(body_type=pymunk.Body.STATIC)
+        right_shape = pymunk.Segment(right_wall, (self.width, 0), (self.width, self.wall_top), wall_thickness)
+        right_shape.user_data = {'color': WHITE}
+        self.space.add(right_wall, right_shape)
+
+        # Death sensor below the screen to detect falling blocks
+        death_body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        death_shape = pymunk.Segment(death_body, (-1000, self.DEATH_Y), (self.width + 1000, self.DEATH_Y), 1)
+        death_shape.sensor = True
+        death_shape.collision_type = self.COL_DEATH
+        death_shape.user_data = {'sensor': True}
+        self.space.add(death_body, death_shape)
+        self.walls = (left_shape, right_shape)
+        self.static_shapes = (ground_shape, left_shape, right_shape, death_shape)
+
+        # Collision handler: block hits death sensor -> game over
+        handler = self.space.add_collision_handler(self.COL_BLOCK, self.COL_DEATH)
+        handler.begin = self._on_block_hits_death
+
+        # Collision handler: blocks colliding with each other -> play hit sounds
+        hit_handler = self.space.add_collision_handler(self.COL_BLOCK, self.COL_BLOCK)
+        # begin/separate fire once per contact, unlike post_solve which runs every step
+        hit_handler.begin = self._on_blocks_collide
+        hit_handler.separate = self._on_blocks_separate
+
+        self._emit('setup', self.space)
+        self.snapshots = SnapshotStore()
+        self.history = deque(maxlen=self.UNDO_DEPTH)
+        self.checkpoints = deque(maxlen=self.CHECKPOINTS_KEPT)
+        self.time_since_last_land = 0.0
+        self._accumulator = 0.0
+        self.previous_transforms = {}
+        self.spawn_block()  # Initial immediate spawn
+
+    def create_block(self, position, shape_index=None):
+        if shape_index is None:
+            shape_index = self.rng.randrange(len(self.prefabs))
+        body, shapes = self._add_block(shape_index, position, self._next_contact_id)
+        self._next_contact_id += len(shapes)
+        return body, shapes[-1]
+
+    def _add_block(self, shape_index, position, block_id):
+        # A block's shapes get consecutive contact ids; the first one doubles as the block id
+        body, shapes = self.prefabs.instantiate(shape_index, position)
+        for i, shape in enumerate(shapes):
+            shape.user_data['contact_id'] = block_id + i
+        self.space.add(body, *shapes)
+        self.registry.add(body, shapes)
+        self.geometry.add(body, shapes)
+        self.settler.track(body)
+        self._emit('block_added', body)
+        return body, shapes
+
+    def spawn_block(self):
+        if self.falling_block:
+            return
+        self.falling_block = self.create_block((self.width // 2, self.spawn_height))
+        self.falling_block[0].velocity = (0, 0)  # Start with zero velocity for control
+        snapshot = self.snapshot()
+        self.history.append(snapshot)
+        if self.blocks_placed and self.blocks_placed % self.CHECKPOINT_EVERY == 0 \
+                and (not self.checkpoints or self.checkpoints[-1].blocks_placed != self.blocks_placed):
+            self.checkpoints.append(snapshot)
+        self._emit('spawn')
+
+    @property
+    def spawn_height(self):
+        return max(self.height - 50, self.tower_top + self.SPAWN_CLEARANCE)
+
+    def skyline(self, columns):
+        """Height of the tower in `columns` equal-width columns between the walls, ignoring the falling block."""
+        falling = (self.falling_block[0],) if self.falling_block else ()
+        return self.geometry.skyline(self.WALL_THICKNESS, self.width - self.WALL_THICKNESS, columns,
+                                     floor=self.WALL_THICKNESS, exclude=falling)
+
+    @property
+    def tower_height(self):
+        return self.tower_top - self.WALL_THICKNESS
+
+    def _track_moving(self, stride=1):
+        # Let the metrics notice blocks that moved; with stride > 1 only every stride-th one, in turn
+        falling = self.falling_block[0] if self.falling_block else None
+        offset = self.steps % stride
+        for i, body in enumerate(self.settler.awake):
+            if i % stride == offset and body is not falling:
+                self.metrics.track_motion(body)
+
+    def update_tower_top(self):
+        """Read tower_top and the lean from the metrics index, then grow the walls if needed."""
+        metrics = self.metrics
+        self.tower_top = max(metrics.height, float(self.WALL_THICKNESS))
+        self.best_height = max(self.best_height, self.tower_height)
+        leaning = len(metrics) > 1 and abs(metrics.lean) > self.LEAN_WARNING
+        if leaning != self.leaning:
+            self.leaning = leaning
+            self._emit('lean', leaning)
+        if self.tower_top + self.height > self.wall_top:
+            self._extend_walls(self.tower_top + 2 * self.height)
+
+    def _extend_walls(self, wall_top):
+        self.wall_top = wall_top
+        for wall in self.walls:
+            wall.unsafe_set_endpoints(wall.a, (wall.b.x, wall_top))
+            self.space.reindex_shape(wall)
+        self._emit('walls', self.static_shapes)
+
+    def snapshot(self):
+        """Capture the world; cheap enough to call every spawn (see SnapshotStore)."""
+        baked, moving = self.snapshots.capture(self.registry, self.settler)
+        falling = self.falling_block[0] if self.falling_block else None
+        state = {
+            'score': self.score,
+            'combo_multiplier': self.combo_multiplier,
+            'last_shape_index': self.last_shape_index,
+            'spawn_delay': self.spawn_delay,
+            'blocks_placed': self.blocks_placed,
+            'time_since_last_land': self.time_since_last_land,
+            'game_over': self.game_over,
+            'falling': self.registry.blocks[falling][0].user_data['contact_id'] if falling else None,
+            'rng': self.rng.getstate(),
+            'next_contact_id': self._next_contact_id,
+            'best_height': self.best_height,
+        }
+        return WorldSnapshot(self.steps, baked, moving, state)
+
+    def restore(self, snapshot: WorldSnapshot):
+        """Put the world back into a snapshot's state.
+
+        Existing bodies are moved back in place; blocks created since are removed and
+        blocks removed since are rebuilt from their prefab. Contact impulses cached by
+        Pymunk aren't part of a snapshot: arbiters that survive the restore keep theirs
+        and warm-start from them on the next tick, so a restored world isn't bit-identical
+        to the one that was captured. Replays stay deterministic because they perform
+        the same restores at the same steps. steps keeps counting up, so input logs stay
+        in order.
+        """
+        settler = self.settler
+        self._restoring = True
+        live = {shapes[0].user_data['contact_id']: body for body, shapes in self.registry.blocks.items()}
+        for block_id, body in live.items():
+            if block_id not in snapshot.baked and block_id not in snapshot.moving:
+                self.registry.remove(body)
+
+        rebaked = []
+        for block_id, record in snapshot.baked.items():
+            body = live.get(block_id)
+            if body is not None and self.snapshots.unchanged(body, record, settler.baked.get(body)):
+                continue  # Stayed baked since the snapshot: nothing to do
+            index, x, y, angle = record
+            if body in settler.baked and body.position == (x, y) and body.angle == angle:
+                continue
+            if body is None:
+                body = live[block_id] = self._add_block(index, (x, y), block_id)[0]
+            settler.thaw(body, cascade=False)
+            # Angle first: Pymunk rotates around the center of gravity, which would move the position
+            body.angle, body.position = angle, (x, y)
+            settler.bake(body)
+            rebaked.append(body)
+            # Static shapes are only re-indexed on request
+            self.space.reindex_shapes_for_body(body)
+
+        for block_id, (index, x, y, angle, vx, vy, angular_velocity, rest) in snapshot.moving.items():
+            body = live.get(block_id)
+            if body is None:
+                body = live[block_id] = self._add_block(index, (x, y), block_id)[0]
+            settler.thaw(body, cascade=False)
+            body.angle, body.position = angle, (x, y)
+            body.velocity, body.angular_velocity = (vx, vy), angular_velocity
+            settler.awake[body] = rest
+
+        state = snapshot.state
+        self.score = state['score']
+        self.combo_multiplier = state['combo_multiplier']
+        self.last_shape_index = state['last_shape_index']
+        self.spawn_delay = state['spawn_delay']
+        self.blocks_placed = state['blocks_placed']
+        self.time_since_last_land = state['time_since_last_land']
+        self.game_over = state['game_over']
+        self.rng.setstate(state['rng'])
+        self._next_contact_id = state['next_contact_id']
+        self.best_height = state['best_height']
+        self.falling_block = None
+        if state['falling'] is not None:
+            body = live[state['falling']]
+            self.falling_block = (body, self.registry.blocks[body][-1])
+            self.metrics.remove(body)
+        # Bottom-up, so depths are right; that's why bakes above didn't update the metrics
+        self._restoring = False
+        self.metrics.refresh(rebaked)
+        self._track_moving()
+        self.previous_transforms = {}
+        self._hit_queue.clear()
+        self.update_tower_top()
+        self._emit('score', self.score)
+        self._emit('restore', snapshot)
+
+    def undo(self):
+        """Take back the last placed block: back to the moment it spawned. Returns False if there's no history."""
+        history = self.history
+        keep = len(history)
+        if keep and self.falling_block and history[-1].state['falling'] == \
+                self.registry.blocks[self.falling_block[0]][0].user_data['contact_id']:
+            # The newest snapshot is the spawn of the block still falling; go back to the one before it
+            keep -= 1
+        if not keep:
+            return False
+        while len(history) > keep:
+            history.pop()
+        self.restore(history[-1])
+        return True
+
+    def restore_checkpoint(self):
+        """Go back to the latest checkpoint. Returns False if none has been taken yet."""
+        if not self.checkpoints:
+            return False
+        checkpoint = self.checkpoints[-1]
+        self.restore(checkpoint)
+        # Later spawns are gone now; the checkpoint is the spawn of the block that is falling again
+        self.history.clear()
+        self.history.append(checkpoint)
+        return True
+
+    def press(self, command):
+        if self.recorder:
+            self.recorder.record(self.steps, command, True)
+        if command == CMD_ROTATE:
+            if self.falling_block:
+                body = self.falling_block[0]
+                body.angle += math.pi / 2  # Rotate 90 degrees
+                self._emit('rotate')
+        elif command == CMD_UNDO:
+            self.undo()
+        elif command == CMD_CHECKPOINT:
+            self.restore_checkpoint()
+        else:
+            self.held[command] = True
+
+    def release(self, command):
+        if self.recorder:
+            self.recorder.record(self.steps, command, False)
+        self.held.pop(command, None)
+
+    def apply_held(self, command):
+        if self.falling_block:
+            if command == CMD_RIGHT:
+                body = self.falling_block[0]
+                vx = min(200, body.velocity.x + 20) # adds velocity up to a certain point
+                body.velocity = (vx, body.velocity.y)
+
+            elif command == CMD_LEFT:
+                body = self.falling_block[0]
+                vx = body.velocity.x
+                vx = max(-200, vx - 20) # adds velocity up to a certain point
+                body.velocity = (vx, body.velocity.y)
+            elif command == CMD_DROP:
+                body = self.falling_block[0]
+                body.velocity = (0, max(-500, body.velocity.y - 100))  # Fast drop straight down
+                self.held.pop(CMD_LEFT, None)
+                self.held.pop(CMD_RIGHT, None)
+
+    def on_update(self, delta_time=FIXED_DT):
+        """Advance by real frame time; returns the interpolation factor for rendering."""
+        self._accumulator += delta_time
+        steps = min(int(self._accumulator / self.FIXED_DT), self.MAX_STEPS_PER_FRAME)
+        for i in range(steps):
+            if i == steps - 1:
+                # Only the last two physics states of a frame are ever interpolated
+                self.previous_transforms = {body: (body.position, body.angle) for body in self.settler.awake}
+            self.step(flush=False)
+            self._accumulator -= self.FIXED_DT
+        self.flush_hits()
+        if self._accumulator >= self.FIXED_DT:
+            # Hit the catch-up cap: drop the backlog instead of trying to simulate it later
+            self._accumulator %= self.FIXED_DT
+        self.render_alpha = self._accumulator / self.FIXED_DT
+        return self.render_alpha
+
+    def step(self, flush=True):
+        """Run one fixed FIXED_DT game tick. on_update defers the hit flush to once per frame."""
+        if self.game_over:
+            return
+        prof = self.profiler
+        prof.start()
+        # Spawn new block after delay since last land, if no current falling block
+        if self.time_since_last_land >= self.spawn_delay and not self.falling_block:
+            self.spawn_block()
+            # Adjust delay every SPAWN_RAMP_BLOCKS blocks (after spawning, based on placed)
+            if self.blocks_placed % self.SPAWN_RAMP_BLOCKS == 0 and self.blocks_placed > 0:
+                self.spawn_delay = max(self.MIN_SPAWN_DELAY, self.spawn_delay - self.SPAWN_DELAY_STEP)
+        for command in list(self.held):
+            self.apply_held(command)
+        self.time_since_last_land += self.FIXED_DT
+        prof.lap('input')
+
+        # Step physics simulation
+        substep_dt = self.FIXED_DT / self.SUBSTEPS
+        for _ in range(self.SUBSTEPS):
+            self.space.step(substep_dt)
+        self.steps += 1
+        prof.lap('physics')
+
+        # Check for landing after physics step
+        if self.falling_block:
+            body = self.falling_block[0]
+            velocity_x = abs(body.velocity.x)
+            velocity_x = max(0, velocity_x - 5)  # Friction effect
+            body.velocity = (math.copysign(velocity_x, body.velocity.x), body.velocity.y)
+            # Considered landed once it has stopped falling on top of something; slow alone isn't
+            # enough, with weak gravity a block is still that slow a tick after it spawns
+            if abs(body.velocity.y) < 3 and self._supported(body):
+                self.on_landing(body)
+        prof.lap('landing')
+
+        # Freeze whatever has come to rest (the block still under player control never is)
+        self.settler.update(self.FIXED_DT, exclude=self.falling_block[0] if self.falling_block else None)
+        # Only moving blocks can leave the world, baked ones never need checking
+        reap_offset = self.steps % self.REAP_CHECK_TICKS
+        if self.registry.reap(self.settler.awake, self.REAP_CHECK_TICKS, reap_offset) and not self.endless:
+            # Gone over a wall and out of the world before it could reach the death sensor
+            self._end_game()
+        self._track_moving(self.TOWER_CHECK_TICKS)
+        self.update_tower_top()
+        prof.lap('settle')
+        if flush:
+            self.flush_hits()
+
+        # Game over handled by death sensor collision
+
+    @staticmethod
+    def _supported(body):
+        # each_arbiter puts body's shape first, so the normal points from it to what it touches
+        normals = []
+        body.each_arbiter(lambda arbiter: normals.append(arbiter.normal.y))
+        return any(y < TowerSettler.SUPPORT_NORMAL_Y for y in normals)
+
+    def _on_block_hits_death(self, arbiter, space, data):
+        # Trigger game over when any block hits the death sensor
+        if not self.endless:
+            self._end_game()
+        return True
+
+    def _end_game(self):
+        if not self.game_over:
+            self._emit('game_over')
+        self.game_over = True
+
+    @staticmethod
+    def _contact_key(arbiter):
+        a, b = arbiter.shapes
+        ia, ib = a.user_data['contact_id'], b.user_data['contact_id']
+        return (ia << 32 | ib) if ia < ib else (ib << 32 | ia)
+
+    def _on_blocks_collide(self, arbiter, space, data):
+        # Called once when two block shapes start touching; keep this cheap, it runs inside space.step
+        timing = self.profiler.enabled
+        if timing:
+            start = perf_counter()
+        shapes = arbiter.shapes
+        self._active_collisions[self._contact_key(arbiter)] = shapes
+        a, b = shapes
+        # Impulse isn't solved yet in begin, so use the approach speed along the contact normal
+        speed = (a.body.velocity - b.body.velocity).dot(arbiter.normal)
+        if speed > 0:
+            # A hard enough hit on a baked block brings it (and what it holds up) back to life
+            self.settler.on_impact(arbiter, speed)
+            if self.listener:
+                self._hit_queue.append(speed)
+        if timing:
+            self.profiler.add('callbacks', perf_counter() - start)
+        # Return True to allow normal physics resolution to continue
+        return True
+
+    def _on_blocks_separate(self, arbiter, space, data):
+        # Called when two block shapes separate, including when one of them is removed
+        self._active_collisions.pop(self._contact_key(arbiter), None)
+
+    def flush_hits(self):
+        """Report the loudest queued block hits and drop the rest."""
+        if not self._hit_queue:
+            return
+        for speed in heapq.nlargest(self.MAX_HITS_PER_FRAME, self._hit_queue):
+            self._emit('hit', max(0.05, min(1.0, speed / self.HIT_FULL_VOLUME_SPEED)))
+        self._hit_queue.clear()
+
+    def on_landing(self, landed_body : pymunk.Body):
+        self._emit('land')
+        shape_index = self.falling_block[1].user_data['index']
+        self.metrics.update(landed_body)
+        base_score = 10
+        if abs(landed_body.position.x - self.width / 2) < 30:
+            base_score += 20  # Centered bonus
+        # Height bonus: the higher up it landed, the more it's worth
+        base_score += int((self.metrics.top_of(landed_body) - self.WALL_THICKNESS) // self.HEIGHT_POINTS_PX)
+        if shape_index == self.last_shape_index and self.last_shape_index != None:
+            self.combo_multiplier += 0.5
+        else:
+            self.combo_multiplier = 1.0
+        self.score += int(base_score * self.combo_multiplier)
+        self.last_shape_index = shape_index
+        self.blocks_placed += 1
+        self.falling_block = None
+        self.time_since_last_land = 0.0  # Reset timer for next spawn delay
+        self.update_tower_top()
+        self._emit('score', self.score)
+
+
+    def _forget_contacts(self, body, removed=False):
+        # Pymunk drops static/static contacts without calling separate, so once a block is baked
+        # (or removed) its stale collision-pair entries are purged here instead
+        static = pymunk.Body.STATIC
+        self._active_collisions = {
+            key: (a, b) for key, (a, b) in self._active_collisions.items()
+            if not (removed and (a.body is body or b.body is body))
+            and not (a.body.body_type == static and b.body.body_type == static)
+        }
+
+    def _on_block_baked(self, body):
+        self._forget_contacts(body)
+        self.geometry.touch(body)
+        if not self._restoring:
+            self.metrics.update(body)
+        self._emit('block_baked', body)
+
+    def _on_block_removed(self, body):
+        self._forget_contacts(body, removed=True)
+        self.settler.untrack(body)
+        self.geometry.remove(body)
+        self.metrics.remove(body)
+        self.previous_transforms.pop(body, None)
+        if self.falling_block and self.falling_block[0] is body:
+            # Lost the block under player control: start the countdown to the next one
+            self.falling_block = None
+            self.time_since_last_land = 0.0
+        self._emit('block_removed', body)
+
+    @property
+    def dynamic_bodies(self):
+        return self.settler.awake.keys()
@@ -0,0 +1,79 @@
+class WorldSnapshot:
+    """Immutable capture of a SkyboxSim, restored with SkyboxSim.restore().
+
+    Blocks are keyed by block id (the contact id of their first shape), not by body, so
+    a snapshot can bring back blocks that were removed after it was taken.
+
+    baked:  block id -> (prefab index, x, y, angle)
+    moving: block id -> (prefab index, x, y, angle, vx, vy, angular velocity, rest time)
+    state:  the sim's own fields (score, spawn timer, rng state, ...)
+
+    The baked dict is shared with every other snapshot taken while no block was baked,
+    thawed or removed, so never modify it.
+    """
+
+    __slots__ = ("tick", "baked", "moving", "state")
+
+    def __init__(self, tick, baked, moving, state):
+        self.tick = tick
+        self.baked = baked
+        self.moving = moving
+        self.state = state
+
+    @property
+    def blocks_placed(self):
+        return self.state["blocks_placed"]
+
+    def __len__(self):
+        return len(self.baked) + len(self.moving)
+
+
+class SnapshotStore:
+    """Captures block state incrementally.
+
+    A baked block can't move, so its record is built once when first seen and reused
+    until the block is baked again (the settler stores a fresh property tuple on every
+    bake, which is what the cache checks). The baked dict itself is only rebuilt when
+    the settler's generation changed; otherwise the previous one is shared. Only the
+    awake blocks are read from Pymunk on every capture.
+    """
+
+    def __init__(self):
+        # body -> (settler props at the time, record, block id)
+        self._records = {}
+        self._baked = {}
+        self._generation = None
+
+    def capture(self, registry, settler):
+        """Return (baked, moving) dicts for the current state of the world."""
+        blocks = registry.blocks
+        if settler.generation != self._generation:
+            records = self._records
+            fresh = {}
+            baked = {}
+            for body, props in settler.baked.items():
+                cached = records.get(body)
+                if cached is None or cached[0] is not props:
+                    position = body.position
+                    user_data = blocks[body][0].user_data
+                    cached = (props, (user_data['index'], position.x, position.y, body.angle), user_data['contact_id'])
+                fresh[body] = cached
+                baked[cached[2]] = cached[1]
+            self._records = fresh
+            self._baked = baked
+            self._generation = settler.generation
+        moving = {}
+        for body, rest in settler.awake.items():
+            shape = blocks[body][0]
+            position, velocity = body.position, body.velocity
+            moving[shape.user_data['contact_id']] = (shape.user_data['index'], position.x, position.y, body.angle,
+                                                     velocity.x, velocity.y, body.angular_velocity, rest)
+        return self._baked, moving
+
+    def unchanged(self, body, record, props):
+        """True if body has stayed baked, with the settler props `props`, since `record` was captured.
+
+        Lets restore() skip the blocks at the bottom of the tower without reading them from Pymunk.
+        """
+        cached = self._records.get(body)
+        return cached is not None and cached[1] is record and cached[0] is props
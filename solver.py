@@ -0,0 +1,281 @@
+"""Placement lookahead for the ghost hint and the autoplayer.
+
+For the falling block, every candidate (x, quarter turns) is tried on a copy of the
+world: restore a snapshot, put the block above the tower at x with that rotation, fast
+drop it and simulate LOOKAHEAD_SECONDS more. A candidate is worth the points its landing
+scored, minus penalties for blocks lost, blocks still moving and a leaning tower.
+
+Candidates are evaluated in worker processes, each with its own SkyboxSim that restores
+the snapshots it is sent, so the game itself only takes a snapshot, submits it and then
+polls for the answer. Without a core to spare for a worker, they are evaluated in the
+game's process instead, a few ticks at a time within a per-frame time budget. Answers
+are cached by tower state, so undoing back to a known state or asking again for the
+same block costs nothing.
+"""
+import concurrent.futures
+import math
+import multiprocessing
+import os
+import pickle
+from collections import OrderedDict
+
+from batch import TargetPolicy
+from profiler import perf_counter
+from replay import game_prefabs
+from sim import SkyboxSim, CMD_DROP, CMD_ROTATE
+
+LOOKAHEAD_SECONDS = 1.5
+MAX_FALL_SECONDS = 3.0
+COLUMNS = 12  # candidate x positions, spread between the walls
+DROP_GAP = 40.0  # px between the tower top and the bottom of the dropped block
+LOST_PENALTY = 200.0  # per block that fell out of the world
+MOVING_PENALTY = 15.0  # per block still moving at the end of the lookahead
+LEAN_PENALTY = 100.0  # per half base width of lean beyond half the warning level
+CACHE_SIZE = 64
+FRAME_BUDGET = 0.004  # s of inline evaluation per request() when there are no workers
+WORKER_NICE = 10  # workers yield to the game when cores are short
+
+
+class Placement:
+    """Where to put a block: x, quarter turns from angle 0, and the pose it ended up in."""
+
+    __slots__ = ("x", "turns", "value", "pose")
+
+    def __init__(self, x, turns, value, pose):
+        self.x = x
+        self.turns = turns
+        self.value = value
+        # (x, y, angle) at the end of the lookahead, or None if the block was lost
+        self.pose = pose
+
+    def rotations_from(self, angle):
+        """UP presses needed to get from angle to this placement's rotation."""
+        return (self.turns - round(angle / (math.pi / 2))) % 4
+
+
+def candidates(sim, columns=COLUMNS):
+    """(x, turns) pairs to try for the falling block, all within the walls."""
+    left, bottom, right, top = sim.prefabs[sim.falling_block[1].user_data['index']].bb
+    inner_left, inner_right = sim.WALL_THICKNESS, sim.width - sim.WALL_THICKNESS
+    # Horizontal extent of the block after 0-3 quarter turns counterclockwise
+    extents = ((left, right), (-top, -bottom), (-right, -left), (bottom, top))
+    result = []
+    for turns, (low, high) in enumerate(extents):
+        first, last = inner_left - low + 1, inner_right - high - 1
+        for i in range(columns):
+            result.append((first + (last - first) * i / max(columns - 1, 1), turns))
+    return result
+
+
+def tower_key(sim):
+    """What a placement depends on, in O(1): the block, the combo state and the tower (via its metrics)."""
+    metrics = sim.metrics
+    center = metrics.center_of_mass or (0.0, 0.0)
+    return (sim.seed, sim.falling_block[1].user_data['index'], sim.last_shape_index, sim.combo_multiplier,
+            len(metrics), round(metrics.height), round(center[0]), round(center[1]))
+
+
+# Per process: the sim candidates are tried on, rebuilt when a different game asks
+_worker = {"game": None, "sim": None}
+
+
+def _init_worker():
+    if hasattr(os, "nice"):
+        try:
+            os.nice(WORKER_NICE)
+        except OSError:
+            pass
+
+
+def _worker_sim(game):
+    if _worker["game"] != game:
+        seed, width, height, endless = game
+        _worker["sim"] = SkyboxSim(width, height, prefabs=game_prefabs(), endless=endless, seed=seed)
+        _worker["game"] = game
+    return _worker["sim"]
+
+
+def evaluate(game, payload, batch, lookahead_ticks):
+    """Try each (x, turns) in batch on the pickled snapshot; returns Placements. Runs in a worker."""
+    search = _search(_worker_sim(game), pickle.loads(payload), batch, lookahead_ticks)
+    try:
+        while True:
+            next(search)
+    except StopIteration as done:
+        return done.value
+
+
+def _search(sim, snapshot, batch, lookahead_ticks):
+    # Generator: yields after every simulated tick so inline callers can stop on a time budget,
+    # returns the Placements
+    results = []
+    for x, turns in batch:
+        results.append((yield from _try(sim, snapshot, x, turns, lookahead_ticks)))
+    return results
+
+
+def _try(sim, snapshot, x, turns, lookahead_ticks):
+    sim.restore(snapshot)
+    sim.spawn_delay = math.inf  # Only the candidate block falls
+    body = sim.falling_block[0]
+    score, blocks = sim.score, len(sim.registry)
+    reach = max(abs(v) for v in sim.prefabs[sim.falling_block[1].user_data['index']].bb)
+    # Angle first: Pymunk rotates around the center of gravity
+    body.angle, body.position = turns * math.pi / 2, (x, sim.tower_top + reach + DROP_GAP)
+    body.velocity, body.angular_velocity = (0, 0), 0
+    sim.press(CMD_DROP)
+    for _ in range(int(MAX_FALL_SECONDS / sim.FIXED_DT)):
+        if sim.falling_block is None or sim.game_over:
+            break
+        sim.step()
+        yield
+    sim.release(CMD_DROP)
+    landed = sim.falling_block is None
+    for _ in range(lookahead_ticks):
+        if sim.game_over:
+            break
+        sim.step()
+        yield
+    value = sim.score - score
+    value -= LOST_PENALTY * (blocks - len(sim.registry) + (0 if landed else 1) + (1 if sim.game_over else 0))
+    value -= MOVING_PENALTY * len(sim.settler.awake)
+    value -= LEAN_PENALTY * max(0.0, abs(sim.metrics.lean) - sim.LEAN_WARNING / 2)
+    pose = (body.position.x, body.position.y, body.angle) if body in sim.registry else None
+    return Placement(x, turns, value, pose)
+
+
+class PlacementSolver:
+    """Finds the best placement for the falling block without blocking the caller.
+
+    request(sim) never waits: it returns the answer for the current falling block once
+    there is one, and None until then. Each falling block is evaluated at most once
+    (less if the tower state is cached).
+
+    By default every core but one (left to the game) runs a worker. With jobs=0, which
+    is also the default on a single core, candidates are evaluated in this process, for
+    at most `budget` seconds per request() call; budget=None evaluates them all in one
+    call (blocking, for scripts and batch runs).
+    """
+
+    def __init__(self, jobs=None, lookahead=LOOKAHEAD_SECONDS, columns=COLUMNS, budget=FRAME_BUDGET):
+        self.jobs = jobs if jobs is not None else (os.cpu_count() or 1) - 1
+        self.budget = budget
+        self.lookahead = lookahead
+        self.columns = columns
+        self.cache = OrderedDict()
+        self._executor = None
+        # (block id, key, world center x, futures, or the inline search) of the evaluation in flight
+        self._pending = None
+        # (block id, placement) of the latest answer
+        self._latest = None
+
+    def request(self, sim):
+        if not sim.falling_block:
+            return None
+        started = perf_counter()
+        block_id = sim.falling_block[1].user_data['contact_id']
+        if not self.jobs and self._pending is not None and self._pending[0] != block_id:
+            # An unfinished inline search for an earlier block: not worth this frame's budget
+            self._pending = None
+        self._poll(started)
+        if self._latest and self._latest[0] == block_id:
+            return self._latest[1]
+        key = tower_key(sim)
+        placement = self.cache.get(key)
+        if placement is not None:
+            self.cache.move_to_end(key)
+            self._latest = (block_id, placement)
+            return placement
+        if self._pending is None or self._pending[0] != block_id:
+            self._submit(sim, block_id, key)
+            self._poll(started)
+            if self._latest and self._latest[0] == block_id:
+                return self._latest[1]
+        return None
+
+    def _submit(self, sim, block_id, key):
+        game = (sim.seed, sim.width, sim.height, sim.endless)
+        payload = pickle.dumps(sim.snapshot(), pickle.HIGHEST_PROTOCOL)
+        todo = candidates(sim, self.columns)
+        ticks = int(self.lookahead / sim.FIXED_DT)
+        if not self.jobs:
+            search = _search(_worker_sim(game), pickle.loads(payload), todo, ticks)
+            self._pending = (block_id, key, sim.width / 2, search)
+            return
+        if self._executor is None:
+            # spawn: workers must not inherit the window, GL context or audio threads
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.jobs, multiprocessing.get_context("spawn"),
+                                                                    initializer=_init_worker)
+        if self._pending:
+            for future in self._pending[3]:
+                future.cancel()
+        try:
+            futures = [self._executor.submit(evaluate, game, payload, todo[i::self.jobs], ticks)
+                       for i in range(min(self.jobs, len(todo)))]
+        except concurrent.futures.BrokenExecutor as e:
+            print(f"[solver] worker pool broke, restarting it: {e}")
+            self._executor = None
+            self._pending = None
+            return
+        self._pending = (block_id, key, sim.width / 2, futures)
+
+    def _poll(self, started):
+        if self._pending is None:
+            return
+        block_id, key, center, work = self._pending
+        if not self.jobs:
+            # Taking the snapshot counts against the budget too
+            deadline = started + self.budget if self.budget is not None else math.inf
+            try:
+                while perf_counter() < deadline:
+                    next(work)
+                return
+            except StopIteration as done:
+                results = done.value
+        else:
+            futures = work
+            if not all(future.done() for future in futures):
+                return
+            try:
+                results = [placement for future in futures for placement in future.result()]
+            except Exception as e:
+                print(f"[solver] evaluation failed: {e}")
+                self._pending = None
+                if isinstance(e, concurrent.futures.BrokenExecutor):
+                    self._executor = None
+                return
+        self._pending = None
+        # Ties go to the candidate nearest the middle, so the answer doesn't depend on how work was split
+        best = max(results, key=lambda p: (p.value, -abs(p.x - center), -p.turns, -p.x))
+        self.cache[key] = best
+        if len(self.cache) > CACHE_SIZE:
+            self.cache.popitem(last=False)
+        self._latest = (block_id, best)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class AutoPlayer(TargetPolicy):
+    """Plays the solver's placements: rotates the block, steers it over x and drops it."""
+
+    def __init__(self, solver):
+        super().__init__(0)
+        self.solver = solver
+        self.placement = None
+
+    def new_block(self, sim, body):
+        self.placement = None
+
+    def steer(self, sim, body):
+        if self.placement is None:
+            self.placement = self.solver.request(sim)
+            if self.placement is None:
+                return  # Still thinking; let it fall
+            self.target = self.placement.x
+            for _ in range(self.placement.rotations_from(body.angle)):
+                sim.press(CMD_ROTATE)
+                sim.release(CMD_ROTATE)
+        super().steer(sim, body)